@@ -0,0 +1,78 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from rest_framework.permissions import SAFE_METHODS
+
+executor = None
+executor_lock = threading.Lock()
+
+
+def get_executor():
+    global executor
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_READ_THREADS,
+                thread_name_prefix='async-reads')
+    return executor
+
+
+def run_read(view, request, *args, **kwargs):
+    """
+    Call a sync view in a pool thread, rendering the response there as well.
+    Pool threads get no request_started/request_finished signals, so
+    their connections are recycled here according to CONN_MAX_AGE.
+    """
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render') and not response.is_rendered:
+            started = time.perf_counter()
+            response.render()
+            request.render_time = time.perf_counter() - started
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_reads(view):
+    """
+    Async version of a sync view: safe methods run in a pool of
+    settings.ASYNC_READ_THREADS threads, others in the single thread
+    Django uses for sync views.
+    """
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS:
+            return await sync_to_async(view, thread_sensitive=True)(
+                request, *args, **kwargs)
+        context = contextvars.copy_context()
+        return await asyncio.get_event_loop().run_in_executor(
+            get_executor(), functools.partial(
+                context.run, run_read, view, request, *args, **kwargs))
+
+    return wrapper
+
+
+class AsyncReadMixin:
+    """
+    With settings.ASYNC_READS (served by foodgram.asgi) routes whose GET
+    action is in async_read_actions get an async view, so slow clients
+    and database waits do not block the worker.
+    """
+    async_read_actions = ()
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if (settings.ASYNC_READS and actions
+                and actions.get('get') in cls.async_read_actions):
+            return async_reads(view)
+        return view
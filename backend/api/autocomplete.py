@@ -0,0 +1,55 @@
+import heapq
+import threading
+from bisect import bisect_left
+
+from recipes.models import Ingredients
+from recipes.signals import reference_state
+
+
+class IngredientPrefixIndex:
+    """
+    Sorted array of lowercased ingredient names, built lazily once per
+    worker process. Workers compare their copy with the Ingredients
+    version from recipes.signals and rebuild when it changes.
+    """
+    def __init__(self):
+        self.version = None
+        self.data = ([], [])
+        self.lock = threading.Lock()
+
+    def build(self):
+        # Rows in the order of the database collation, as
+        # IngredientSearchFilter.prefix_search returns them
+        rows = list(Ingredients.objects.order_by('name', 'id').values(
+            'id', 'name', 'measurement_unit'))
+        self.data = (
+            sorted((row['name'].lower(), position)
+                   for position, row in enumerate(rows)),
+            rows)
+
+    def search(self, term, limit):
+        """
+        The names starting with term, as LOWER(name) LIKE 'term%' on
+        PostgreSQL (SQLite ignores the case of ASCII letters only).
+        :param term: name prefix
+        :param limit: max results
+        :return: list of ingredient dicts, ordered by name and id
+        """
+        version = reference_state(Ingredients)['version']
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.build()
+                    self.version = version
+        keys, rows = self.data
+        term = term.lower()
+        positions = []
+        for position in range(bisect_left(keys, (term,)), len(keys)):
+            key, row = keys[position]
+            if not key.startswith(term):
+                break
+            positions.append(row)
+        return [rows[row] for row in heapq.nsmallest(limit, positions)]
+
+
+ingredient_index = IngredientPrefixIndex()
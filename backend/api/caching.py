@@ -0,0 +1,50 @@
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+from recipes.signals import reference_state
+
+
+class CachedReferenceMixin:
+    """
+    Cache serialized list/retrieve payloads of read-only reference data
+    and answer conditional GET with 304. Cache keys include the model
+    version, which recipes.signals bumps on every change.
+    """
+    def cached_response(self, request, get_data):
+        model = self.queryset.model
+        state = reference_state(model)
+        key = (f'reference:{model._meta.label_lower}:{state["version"]}:'
+               f'{request.get_full_path()}')
+        entry = cache.get(key)
+        if entry is None:
+            data = get_data()
+            etag = '"{}"'.format(hashlib.md5(json.dumps(
+                data, sort_keys=True, ensure_ascii=False).encode()
+            ).hexdigest())
+            entry = {'data': data, 'etag': etag}
+            cache.set(key, entry)
+        last_modified = int(state['modified'])
+        response = get_conditional_response(
+            request, etag=entry['etag'], last_modified=last_modified)
+        if response is None:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def get_list_data(self):
+        return super().list(self.request).data
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, self.get_list_data)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request,
+            lambda: super(CachedReferenceMixin, self).retrieve(
+                request, *args, **kwargs).data)
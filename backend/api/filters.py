@@ -1,15 +1,96 @@
+from django.db import connection
+from django.db.models import (Case, Exists, FloatField, IntegerField, OuterRef,
+                              Q, Value, When)
+from django.db.models.functions import Lower
 from django_filters import rest_framework as filters
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
 
 from recipes.models import Recipes
+from recipes.search import search
 
 
 class CustomFilter(filters.FilterSet):
     author = filters.NumberFilter(field_name='author__id')
     tags = filters.CharFilter(method='filter_tags')
+    ordering = filters.ChoiceFilter(method='filter_ordering',
+                                    choices=(('popular', 'popular'),))
+    search = filters.CharFilter(method='filter_search')
 
     def filter_tags(self, qs, name, value):
-        return qs.filter(tag__slug__in=self.request.GET.getlist('tags'))
+        return qs.filter(Exists(Recipes.tag.through.objects.filter(
+            recipes=OuterRef('pk'),
+            tags__slug__in=self.request.GET.getlist('tags'))))
+
+    def filter_ordering(self, qs, name, value):
+        return qs.order_by('-favorites_count', '-pub_date', '-id')
+
+    def filter_search(self, qs, name, value):
+        return search(qs, value)
 
     class Meta:
         model = Recipes
-        fields = ['author', 'tags']
+        fields = ['author', 'tags', 'ordering', 'search']
+
+
+class IngredientSearchFilter(BaseFilterBackend):
+    """
+    Ingredient autocomplete: prefix matches by name first, then substring
+    and (on PostgreSQL) trigram matches ranked by similarity. When there
+    are max_results prefix matches only the prefix query runs, using the
+    lower(name) text_pattern_ops index from recipes.signals; the other
+    matches use its trigram index.
+    """
+    search_param = api_settings.SEARCH_PARAM
+    max_results = 50
+    # Lowest similarity of a trigram match; the % operator that lets the
+    # index find candidates applies pg_trgm.similarity_threshold (0.3 by
+    # default) first
+    trigram_threshold = 0.3
+
+    def filter_queryset(self, request, queryset, view):
+        term = request.query_params.get(self.search_param, '').strip()
+        if not term or getattr(view, 'action', 'list') != 'list':
+            return queryset
+        prefix = list(self.prefix_search(queryset, term)[:self.max_results])
+        if len(prefix) == self.max_results:
+            return prefix
+        if connection.vendor == 'postgresql':
+            queryset = self.postgres_search(queryset, term.lower())
+        else:
+            queryset = self.fallback_search(queryset, term)
+        return queryset[:self.max_results]
+
+    @staticmethod
+    def prefix_search(queryset, term):
+        if connection.vendor == 'postgresql':
+            queryset = queryset.annotate(lower_name=Lower('name')).filter(
+                lower_name__startswith=term.lower())
+        else:
+            queryset = queryset.filter(name__istartswith=term)
+        return queryset.order_by('name', 'id')
+
+    def postgres_search(self, queryset, term):
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        return queryset.annotate(
+            lower_name=Lower('name'),
+            similarity=TrigramSimilarity('lower_name', term),
+        ).filter(
+            Q(lower_name__contains=term)
+            | Q(lower_name__trigram_similar=term,
+                similarity__gte=self.trigram_threshold)
+        ).annotate(
+            is_prefix=Case(When(lower_name__startswith=term, then=Value(0)),
+                           default=Value(1), output_field=IntegerField()),
+            # Prefix matches by name, as prefix_search
+            rank=Case(When(is_prefix=0, then=Value(1.0)),
+                      default='similarity', output_field=FloatField()),
+        ).order_by('is_prefix', '-rank', 'name', 'id')
+
+    @staticmethod
+    def fallback_search(queryset, term):
+        return queryset.filter(name__icontains=term).annotate(
+            is_prefix=Case(When(name__istartswith=term, then=Value(0)),
+                           default=Value(1), output_field=IntegerField()),
+        ).order_by('is_prefix', 'name', 'id')
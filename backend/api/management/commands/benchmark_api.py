@@ -0,0 +1,184 @@
+import json
+import random
+import time
+from contextlib import ExitStack
+from itertools import combinations
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import Count
+from django.test import Client
+from recipes.models import Ingredients, Recipes, Tags
+from rest_framework.authtoken.models import Token
+
+from api.metrics import QueryStats
+from api.paginations import MyPagination
+
+User = get_user_model()
+# OFFSET pagination deep into the list, if the data has that many pages
+DEEP_PAGE = 50
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[round(share * (len(values) - 1))]
+
+
+def get_user(username=None):
+    """:return: the user by username or the one with most subscriptions"""
+    if username:
+        return User.objects.get(username=username)
+    user = User.objects.annotate(follows=Count('follower')).order_by(
+        '-follows').first()
+    if user is None:
+        raise CommandError('No users, run seed_data first')
+    return user
+
+
+def scenarios(rng):
+    """(name, callable returning url) pairs covering the public API."""
+    all_slugs = list(Tags.objects.values_list('slug', flat=True)[:10])
+    slugs = all_slugs[:2]
+    author = Recipes.objects.exclude(author=None).values_list(
+        'author', flat=True).first()
+    recipe_ids = list(Recipes.objects.values_list('id', flat=True)[:1000])
+    names = list(Ingredients.objects.values_list('name', flat=True)[:500])
+    ingredient_ids = list(
+        Ingredients.objects.values_list('id', flat=True)[:500])
+    if not recipe_ids or not names:
+        raise CommandError('No recipes or ingredients, run seed_data')
+    pages = -(-Recipes.objects.count() // MyPagination.page_size)
+    deep_page = min(DEEP_PAGE, pages)
+
+    filters = {
+        'tags': '&'.join(f'tags={slug}' for slug in slugs),
+        'author': f'author={author}',
+        'is_favorited': 'is_favorited=1',
+        'is_in_shopping_cart': 'is_in_shopping_cart=1',
+    }
+    for size in range(len(filters) + 1):
+        for combination in combinations(filters, size):
+            query = '&'.join(filters[name] for name in combination)
+            yield (f'recipes_list[{"+".join(combination) or "all"}]',
+                   lambda query=query: f'/api/recipes/?{query}')
+    every_tag = '&'.join(f'tags={slug}' for slug in all_slugs)
+    yield ('recipes_list[tags=all]',
+           lambda: f'/api/recipes/?{every_tag}')
+    yield ('recipes_list[tags=all+is_favorited+is_in_shopping_cart]',
+           lambda: f'/api/recipes/?{every_tag}&is_favorited=1'
+                   '&is_in_shopping_cart=1')
+    yield (f'recipes_list[page={deep_page}]',
+           lambda: f'/api/recipes/?page={deep_page}')
+    yield 'recipes_list[cursor]', lambda: '/api/recipes/?cursor='
+    yield ('recipes_list[ordering=popular]',
+           lambda: '/api/recipes/?ordering=popular')
+    yield ('recipes_list[search]',
+           lambda: f'/api/recipes/?search={rng.choice(names)}')
+    yield ('recipes_by_ingredients',
+           lambda: '/api/recipes/by_ingredients/?ingredients=' + ','.join(
+               map(str, rng.sample(ingredient_ids,
+                                   min(10, len(ingredient_ids))))))
+    yield ('recipe_retrieve',
+           lambda: f'/api/recipes/{rng.choice(recipe_ids)}/')
+    yield ('recipe_similar',
+           lambda: f'/api/recipes/{rng.choice(recipe_ids)}/similar/')
+    yield ('subscriptions',
+           lambda: '/api/users/subscriptions/?recipes_limit=3')
+    yield 'subscription_feed', lambda: '/api/users/feed/'
+    yield ('ingredient_search',
+           lambda: '/api/ingredients/?name='
+                   + rng.choice(names)[:rng.randint(1, 4)])
+    yield ('download_shopping_cart',
+           lambda: '/api/recipes/download_shopping_cart/')
+    yield ('shopping_cart_summary',
+           lambda: '/api/recipes/shopping_cart_summary/')
+
+
+def token_client(user):
+    return Client(HTTP_AUTHORIZATION='Token ' + Token.objects.get_or_create(
+        user=user)[0].key)
+
+
+class Command(BaseCommand):
+    help = ('Benchmark API endpoints on the current database (see '
+            'seed_data): p50/p95 latency and queries per request')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--user', type=str,
+                            help='username, by default the user with the '
+                                 'most subscriptions')
+        parser.add_argument('--only', type=str,
+                            help='run scenarios whose name contains this')
+        parser.add_argument('--baseline', type=str,
+                            help='json file to compare with')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='write results to --baseline')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='allowed p95 growth against the baseline')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.client = token_client(get_user(options['user']))
+        results = {}
+        for name, url in scenarios(self.rng):
+            if options['only'] and options['only'] not in name:
+                continue
+            results[name] = self.measure(url, options['iterations'],
+                                         options['warmup'])
+            self.stdout.write('{:<60} p50 {:>8.1f}ms  p95 {:>8.1f}ms  '
+                              'queries {:>4}'.format(name,
+                                                     *results[name].values()))
+
+        if options['baseline'] and options['save_baseline']:
+            with open(options['baseline'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(
+                f'Baseline saved to {options["baseline"]}'))
+        elif options['baseline']:
+            self.compare(results, options['baseline'], options['tolerance'])
+
+    def measure(self, url, iterations, warmup):
+        durations = []
+        queries = 0
+        for number in range(warmup + iterations):
+            stats = QueryStats()
+            path = url()
+            started = time.perf_counter()
+            with ExitStack() as stack:
+                # Reads may go to replicas (foodgram.routers)
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.client.get(path)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            duration = time.perf_counter() - started
+            if response.status_code != 200:
+                raise CommandError(f'{path}: {response.status_code}')
+            if number >= warmup:
+                durations.append(duration * 1000)
+                queries = max(queries, stats.count)
+        return {'p50': percentile(durations, 0.5),
+                'p95': percentile(durations, 0.95),
+                'queries': queries}
+
+    def compare(self, results, path, tolerance):
+        with open(path) as f:
+            baseline = json.load(f)
+        regressions = []
+        for name, base in baseline.items():
+            if name not in results:
+                continue
+            current = results[name]
+            if current['p95'] > base['p95'] * (1 + tolerance):
+                regressions.append(f'{name}: p95 {current["p95"]:.1f}ms, '
+                                   f'baseline {base["p95"]:.1f}ms')
+            if current['queries'] > base['queries']:
+                regressions.append(f'{name}: {current["queries"]} queries, '
+                                   f'baseline {base["queries"]}')
+        if regressions:
+            raise CommandError('Regressions:\n' + '\n'.join(regressions))
+        self.stdout.write(self.style.SUCCESS('No regressions'))
@@ -0,0 +1,82 @@
+import random
+import time
+
+from django.core.management import BaseCommand, CommandError
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from recipes.models import Ingredients
+
+from api.autocomplete import IngredientPrefixIndex
+from api.filters import IngredientSearchFilter
+
+from .benchmark_api import percentile
+
+
+class SearchView:
+    """What the filter backends read from IngredientViewSet."""
+    action = 'list'
+    search_fields = ('^name',)
+
+
+class Command(BaseCommand):
+    help = ('Compare the in-memory ingredient prefix index of '
+            '/api/ingredients/?name= with IngredientSearchFilter and the '
+            'former SearchFilter on ^name')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        names = list(Ingredients.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError('No ingredients, run load_ingredients or '
+                               'seed_data first')
+        terms = [name[:rng.randint(1, 4)] for name in rng.choices(
+            names, k=options['iterations'])]
+
+        index = IngredientPrefixIndex()
+        started = time.perf_counter()
+        index.search(terms[0], IngredientSearchFilter.max_results)
+        self.stdout.write(
+            f'index build: {(time.perf_counter() - started) * 1000:.0f}ms, '
+            f'{len(names)} ingredients')
+
+        limit = IngredientSearchFilter.max_results
+        paths = {
+            'index': lambda term: [row['id']
+                                   for row in index.search(term, limit)],
+            'filter': lambda term: self.filter_ids(
+                IngredientSearchFilter(), term),
+            'search': lambda term: self.filter_ids(SearchFilter(), term),
+        }
+        timings = {name: [] for name in paths}
+        differ = 0
+        for term in terms:
+            results = {}
+            for name, search in paths.items():
+                started = time.perf_counter()
+                results[name] = search(term)
+                timings[name].append((time.perf_counter() - started) * 1000)
+            # The view serves the index only when it fills the page,
+            # otherwise the filter adds substring matches
+            if (len(results['index']) == limit
+                    and results['index'] != results['filter']):
+                differ += 1
+
+        for name, values in timings.items():
+            self.stdout.write(f'{name:6} p50 {percentile(values, 0.5):8.3f}ms '
+                              f'p95 {percentile(values, 0.95):8.3f}ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(terms)} prefixes, index and IngredientSearchFilter '
+            f'differ on {differ}'))
+
+    @staticmethod
+    def filter_ids(backend, term):
+        request = Request(APIRequestFactory().get(
+            '/api/ingredients/', {backend.search_param: term}))
+        # IngredientSearchFilter returns a list for prefix-only results
+        return [ingredient.pk for ingredient in backend.filter_queryset(
+            request, Ingredients.objects.all(), SearchView())]
@@ -0,0 +1,85 @@
+import asyncio
+import random
+import ssl
+import time
+from urllib.parse import urlsplit
+
+from django.core.management import BaseCommand, CommandError
+
+from .benchmark_api import percentile
+
+
+async def fetch(url, headers, timeout):
+    """One GET over a new connection, :return: status code"""
+    parts = urlsplit(url)
+    secure = parts.scheme == 'https'
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(
+        parts.hostname, parts.port or (443 if secure else 80),
+        ssl=ssl.create_default_context() if secure else None), timeout)
+    try:
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        writer.write(
+            f'GET {path or "/"} HTTP/1.1\r\nHost: {parts.netloc}\r\n'
+            f'{headers}Connection: close\r\n\r\n'.encode())
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+class Command(BaseCommand):
+    help = ('Throughput and latency of a running server (sync or ASGI '
+            'workers) under many concurrent connections')
+
+    def add_arguments(self, parser):
+        parser.add_argument('urls', nargs='+',
+                            help='requested in random order')
+        parser.add_argument('--connections', type=int, default=500)
+        parser.add_argument('--duration', type=float, default=30,
+                            help='seconds')
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--token', type=str,
+                            help='auth token of the requesting user')
+
+    def handle(self, *args, **options):
+        for url in options['urls']:
+            if urlsplit(url).scheme not in ('http', 'https'):
+                raise CommandError(f'Not an http(s) url: {url}')
+        headers = (f'Authorization: Token {options["token"]}\r\n'
+                   if options['token'] else '')
+        durations, errors = asyncio.get_event_loop().run_until_complete(
+            self.run(options['urls'], headers, options['connections'],
+                     options['duration'], options['timeout']))
+        if not durations:
+            raise CommandError(f'No successful responses, {errors} errors')
+        self.stdout.write(
+            f'{len(durations)} responses, '
+            f'{len(durations) / options["duration"]:.1f} rps, '
+            f'p50 {percentile(durations, 0.5):.1f}ms, '
+            f'p95 {percentile(durations, 0.95):.1f}ms, {errors} errors')
+
+    @staticmethod
+    async def run(urls, headers, connections, duration, timeout):
+        durations = []
+        errors = 0
+        deadline = time.monotonic() + duration
+
+        async def client():
+            nonlocal errors
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    status = await fetch(random.choice(urls), headers,
+                                         timeout)
+                except (OSError, asyncio.TimeoutError, IndexError,
+                        ValueError):
+                    errors += 1
+                    continue
+                if status == 200:
+                    durations.append((time.perf_counter() - started) * 1000)
+                else:
+                    errors += 1
+
+        await asyncio.gather(*(client() for _ in range(connections)))
+        return durations, errors
@@ -0,0 +1,70 @@
+import random
+import time
+
+from django.core.management import BaseCommand, CommandError
+from django.db.models import Count, F, FloatField, Q
+from django.db.models.functions import Cast
+from recipes.models import IngredientCount, Ingredients
+
+from api.matching import RecipeIngredientIndex
+
+from .benchmark_api import percentile
+
+
+def sql_match(ingredient_ids, max_missing=None):
+    """The same ranking as RecipeIngredientIndex.match as one aggregate."""
+    queryset = IngredientCount.objects.order_by().values('recipe').annotate(
+        total=Count('pk'),
+        hits=Count('pk', filter=Q(ingredient__in=ingredient_ids)),
+    ).filter(hits__gt=0).annotate(
+        coverage=Cast('hits', FloatField()) / F('total'),
+        missing=F('total') - F('hits'))
+    if max_missing is not None:
+        queryset = queryset.filter(missing__lte=max_missing)
+    return [(row['recipe'], row['coverage'], row['missing'])
+            for row in queryset.order_by('-coverage', 'missing', '-recipe_id')]
+
+
+class Command(BaseCommand):
+    help = ('Compare the in-memory ingredient index of '
+            '/api/recipes/by_ingredients/ with an SQL aggregate')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=100)
+        parser.add_argument('--have', type=int, default=10,
+                            help='ingredients per query')
+        parser.add_argument('--max-missing', type=int)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        ingredient_ids = list(IngredientCount.objects.order_by().values_list(
+            'ingredient', flat=True).distinct())
+        if not ingredient_ids:
+            raise CommandError('No recipes, run seed_data first')
+        have = min(options['have'], len(ingredient_ids))
+        queries = [rng.sample(ingredient_ids, have)
+                   for _ in range(options['iterations'])]
+
+        index = RecipeIngredientIndex()
+        started = time.perf_counter()
+        index.sync()
+        self.stdout.write(
+            f'index build: {(time.perf_counter() - started) * 1000:.0f}ms, '
+            f'{len(index.recipes)} recipes, '
+            f'{Ingredients.objects.count()} ingredients')
+
+        timings = {'index': [], 'sql': []}
+        for query in queries:
+            results = {}
+            for name, match in (('index', index.match), ('sql', sql_match)):
+                started = time.perf_counter()
+                results[name] = match(query, options['max_missing'])
+                timings[name].append((time.perf_counter() - started) * 1000)
+            if [row[0] for row in results['index'][:50]] != [
+                    row[0] for row in results['sql'][:50]]:
+                raise CommandError(f'Results differ for {query}')
+
+        for name, values in timings.items():
+            self.stdout.write(f'{name:6} p50 {percentile(values, 0.5):8.2f}ms '
+                              f'p95 {percentile(values, 0.95):8.2f}ms')
@@ -0,0 +1,121 @@
+import base64
+import io
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.test import override_settings
+from drf_base64.fields import Base64ImageField
+from PIL import Image
+from rest_framework.test import APIClient
+from recipes.images import process_recipe_image
+from recipes.models import Ingredients, Recipes, Tags
+
+from api.serializers import RecipeImageField
+
+User = get_user_model()
+
+NAME = 'benchmark_upload_memory'
+
+
+class Rollback(Exception):
+    pass
+
+
+def peak_rss():
+    """:return: peak resident set size of the process, MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+def png(megabytes):
+    """:return: PNG of random pixels, about megabytes in size"""
+    side = int((megabytes * 2 ** 20 / 3) ** 0.5)
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', (side, side), os.urandom(side * side * 3)).save(
+        buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def upload(user_id, body, legacy):
+    """
+    POST /api/recipes/ with the body, then process the image as
+    RECIPE_IMAGE_WORKERS=0 does; writes are rolled back. Runs in a new
+    process, so the peak RSS is the one of this upload.
+    :param legacy: decode as the former Base64ImageField, the whole
+        string at once in memory
+    :return: (MB of peak RSS growth by the request, by the processing)
+    """
+    start = peak_rss()
+    client = APIClient()
+    client.force_authenticate(User.objects.get(pk=user_id))
+    decode = (Base64ImageField._decode if legacy
+              else RecipeImageField._decode)
+    with tempfile.TemporaryDirectory() as media_root, \
+            override_settings(MEDIA_ROOT=media_root):
+        try:
+            with transaction.atomic():
+                with mock.patch.object(RecipeImageField, '_decode', decode):
+                    response = client.post('/api/recipes/', body,
+                                           content_type='application/json')
+                if response.status_code != 201:
+                    raise CommandError(
+                        f'{response.status_code} {response.content[:500]}')
+                request = peak_rss()
+                recipe = Recipes.objects.get(pk=response.data['id'])
+                process_recipe_image(recipe.pk, recipe.image.name)
+                raise Rollback
+        except Rollback:
+            pass
+    return request - start, peak_rss() - request
+
+
+class Command(BaseCommand):
+    help = ('Peak RSS of creating a recipe with a base64 image through '
+            'the API: chunked decoding of RecipeImageField against the '
+            'former Base64ImageField')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=float, default=10,
+                            help='image size, MB')
+
+    def handle(self, *args, **options):
+        image = png(options['size'])
+        user = User.objects.create_user(username=NAME,
+                                        email=f'{NAME}@example.com')
+        tag = Tags.objects.create(name=NAME, color='#fff', slug=NAME)
+        ingredient = Ingredients.objects.create(name=NAME,
+                                                measurement_unit='г')
+        try:
+            body = json.dumps({
+                'name': NAME, 'text': NAME, 'cooking_time': 1,
+                'tags': [tag.pk],
+                'ingredients': [{'id': ingredient.pk, 'amount': 1}],
+                'image': ('data:image/png;base64,'
+                          + base64.b64encode(image).decode()),
+            }).encode()
+            self.stdout.write(f'image {len(image) / 2 ** 20:.1f} MB, '
+                              f'request body {len(body) / 2 ** 20:.1f} MB')
+            for name, legacy in (('base64imagefield', True),
+                                 ('chunked', False)):
+                # A forked process inherits no open connection
+                connections.close_all()
+                with multiprocessing.get_context('fork').Pool(1) as pool:
+                    request, processing = pool.apply(
+                        upload, (user.pk, body, legacy))
+                self.stdout.write(
+                    f'{name:<16} request +{request:6.1f} MB '
+                    f'processing +{processing:6.1f} MB')
+        finally:
+            ingredient.delete()
+            tag.delete()
+            user.delete()
+        self.stdout.write(self.style.SUCCESS('peak RSS growth per upload'))
@@ -0,0 +1,106 @@
+import random
+import re
+from contextlib import ExitStack
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+
+from .benchmark_api import get_user, scenarios, token_client
+
+# Full table scans in PostgreSQL and SQLite plans
+SEQ_SCAN = re.compile(
+    r'Seq Scan on (\w+)|\bSCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN the SELECT queries the API issues on the current '
+            'database (see seed_data) and report sequential scans')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=str,
+                            help='username, by default the user with the '
+                                 'most subscriptions')
+        parser.add_argument('--only', type=str,
+                            help='explain scenarios whose name contains '
+                                 'this')
+        parser.add_argument('--min-rows', type=int, default=1000,
+                            help='ignore scans of smaller tables')
+        parser.add_argument('--fail', action='store_true',
+                            help='exit with an error on sequential scans')
+
+    def handle(self, *args, **options):
+        client = token_client(get_user(options['user']))
+        sizes = {}
+        problems = []
+        for name, url in scenarios(random.Random(1)):
+            if options['only'] and options['only'] not in name:
+                continue
+            queries = self.capture(client, url())
+            for number, (alias, sql, params) in enumerate(queries, 1):
+                plan = self.explain(alias, sql, params)
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'{name} #{number}:\n{sql}\n{plan}\n')
+                for table in self.scanned_tables(plan):
+                    if (alias, table) not in sizes:
+                        sizes[alias, table] = self.table_size(alias, table)
+                    if sizes[alias, table] >= options['min_rows']:
+                        problems.append(
+                            f'{name} #{number}: sequential scan on {table} '
+                            f'({sizes[alias, table]} rows)')
+            self.stdout.write(f'{name}: {len(queries)} queries')
+
+        for problem in problems:
+            self.stdout.write(self.style.WARNING(problem))
+        if problems and options['fail']:
+            raise CommandError(f'{len(problems)} sequential scans')
+        if not problems:
+            self.stdout.write(self.style.SUCCESS('No sequential scans'))
+
+    @staticmethod
+    def capture(client, path):
+        """:return: [(alias, sql, params)] of the SELECTs of the request"""
+        queries = []
+
+        def record(alias):
+            def wrapper(execute, sql, params, many, context):
+                if sql.lstrip().upper().startswith('SELECT'):
+                    queries.append((alias, sql, params))
+                return execute(sql, params, many, context)
+            return wrapper
+
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(
+                    connections[alias].execute_wrapper(record(alias)))
+            response = client.get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        if response.status_code != 200:
+            raise CommandError(f'{path}: {response.status_code}')
+        return queries
+
+    @staticmethod
+    def explain(alias, sql, params):
+        connection = connections[alias]
+        prefix = connection.ops.explain_query_prefix(
+            **({'analyze': True} if connection.vendor == 'postgresql'
+               else {}))
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return '\n'.join(' '.join(str(column) for column in row)
+                             for row in cursor.fetchall())
+
+    @staticmethod
+    def scanned_tables(plan):
+        for line in plan.splitlines():
+            match = SEQ_SCAN.search(line.strip())
+            if match:
+                yield match.group(1) or match.group(2)
+
+    @staticmethod
+    def table_size(alias, table):
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {connection.ops.quote_name(table)}')
+            return cursor.fetchone()[0]
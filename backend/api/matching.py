@@ -0,0 +1,93 @@
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import chain
+
+from recipes.models import IngredientCount
+from recipes.signals import recipe_changes
+
+
+class RecipeIngredientIndex:
+    """
+    Inverted index: ingredient id -> sorted array of recipe ids, and
+    recipe id -> its ingredient ids. Built lazily once per worker
+    process and patched from the change log of recipes.signals.
+    """
+    def __init__(self):
+        self.position = None
+        self.postings = {}
+        self.recipes = {}
+        self.lock = threading.Lock()
+
+    def build(self):
+        postings = defaultdict(lambda: array('q'))
+        recipes = defaultdict(list)
+        for recipe, ingredient in IngredientCount.objects.order_by(
+                'recipe_id').values_list('recipe', 'ingredient').iterator():
+            postings[ingredient].append(recipe)
+            recipes[recipe].append(ingredient)
+        self.postings = dict(postings)
+        self.recipes = {recipe: tuple(ingredients)
+                        for recipe, ingredients in recipes.items()}
+
+    def patch(self, recipe_ids):
+        """Reload the ingredients of the changed or deleted recipes."""
+        current = defaultdict(set)
+        for recipe, ingredient in IngredientCount.objects.filter(
+                recipe__in=recipe_ids).values_list('recipe', 'ingredient'):
+            current[recipe].add(ingredient)
+        for recipe in recipe_ids:
+            old = set(self.recipes.get(recipe, ()))
+            new = current.get(recipe, set())
+            for ingredient in old - new:
+                recipes = self.postings[ingredient]
+                position = bisect_left(recipes, recipe)
+                if position < len(recipes) and recipes[position] == recipe:
+                    del recipes[position]
+                if not recipes:
+                    del self.postings[ingredient]
+            for ingredient in new - old:
+                insort(self.postings.setdefault(ingredient, array('q')),
+                       recipe)
+            if new:
+                self.recipes[recipe] = tuple(new)
+            else:
+                self.recipes.pop(recipe, None)
+
+    def sync(self):
+        last, changed = recipe_changes(self.position)
+        if last == self.position:
+            return
+        with self.lock:
+            last, changed = recipe_changes(self.position)
+            if changed is None:
+                self.build()
+            elif changed:
+                self.patch(changed)
+            self.position = last
+
+    def match(self, ingredient_ids, max_missing=None):
+        """
+        :param ingredient_ids: ingredients the user has
+        :param max_missing: drop recipes missing more ingredients
+        :return: [(recipe id, coverage, missing)] with the best coverage
+            first, then fewer missing, then newer recipes
+        """
+        self.sync()
+        hits = Counter(chain.from_iterable(
+            self.postings.get(ingredient, ())
+            for ingredient in set(ingredient_ids)))
+        results = []
+        for recipe, count in hits.items():
+            total = len(self.recipes.get(recipe, ()))
+            if not total or (max_missing is not None
+                             and total - count > max_missing):
+                continue
+            results.append((count / total, count - total, recipe))
+        results.sort(reverse=True)
+        return [(recipe, coverage, -missing)
+                for coverage, missing, recipe in results]
+
+
+recipe_index = RecipeIngredientIndex()
@@ -0,0 +1,257 @@
+import asyncio
+import contextvars
+import hmac
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+METRICS = {
+    'request_duration_seconds': (
+        'Request time including SQL and rendering', DURATION_BUCKETS),
+    'request_db_seconds': ('SQL time per request', DURATION_BUCKETS),
+    'request_serialize_seconds': (
+        'Serializer time per request, without its SQL', DURATION_BUCKETS),
+    'request_render_seconds': ('Response rendering time', DURATION_BUCKETS),
+    'request_queries': (
+        'SQL queries per request', (1, 2, 5, 10, 20, 50, 100, 200)),
+    'response_size_bytes': (
+        'Response body size', (100, 1000, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7)),
+}
+PREFIX = 'foodgram_'
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[position] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Histograms per (metric, route, method) of this worker process."""
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, route, method, values):
+        with self.lock:
+            for metric, value in values.items():
+                key = (metric, route, method)
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram(METRICS[metric][1])
+                self.histograms[key].observe(value)
+
+    def exposition(self):
+        """Prometheus text format."""
+        lines = []
+        with self.lock:
+            for metric, (description, _) in METRICS.items():
+                name = PREFIX + metric
+                lines.append(f'# HELP {name} {description}')
+                lines.append(f'# TYPE {name} histogram')
+                for (key, route, method), histogram in sorted(
+                        self.histograms.items()):
+                    if key != metric:
+                        continue
+                    labels = f'route="{route}",method="{method}"'
+                    for bound, count in zip(histogram.buckets,
+                                            histogram.counts):
+                        lines.append(
+                            f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} '
+                                 f'{histogram.count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.sum}')
+                    lines.append(f'{name}_count{{{labels}}} '
+                                 f'{histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+# QueryStats of the current request, copied to the threads of its view
+current_stats = contextvars.ContextVar('query_stats', default=None)
+
+
+class QueryStats:
+    """
+    connection.execute_wrapper counting queries and their time; the
+    serializer time of the request is added by timed_data.
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+        self.serialize = 0
+        self.serializing = False
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+def count_queries(execute, sql, params, many, context):
+    """execute_wrapper of every connection, counts into current_stats."""
+    stats = current_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def timed_data(data):
+    """
+    Wrap the BaseSerializer.data getter: views evaluate it before the
+    response is rendered. Only the outermost serializer is timed, and
+    the SQL it runs is left to request_db_seconds.
+    """
+    def timed(serializer):
+        stats = current_stats.get()
+        if stats is None or stats.serializing:
+            return data(serializer)
+        stats.serializing = True
+        started = time.perf_counter()
+        db_duration = stats.duration
+        try:
+            return data(serializer)
+        finally:
+            stats.serializing = False
+            stats.serialize += (time.perf_counter() - started
+                                - (stats.duration - db_duration))
+
+    return timed
+
+
+def install_serializer_timer():
+    """Called once by api.apps."""
+    from rest_framework.serializers import BaseSerializer
+
+    BaseSerializer.data = property(timed_data(BaseSerializer.data.fget))
+
+
+def install_query_counter(sender, connection, **kwargs):
+    """
+    connection_created receiver (api.apps). First in the list, so that
+    connection.execute_wrapper() blocks pop their own wrapper.
+    """
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_queries)
+
+
+class RequestMetricsMiddleware:
+    """
+    Per request: SQL queries and time, serializer and rendering time and
+    response size.
+    Sent back in the Server-Timing header, aggregated for /api/metrics/
+    and logged when the number of queries exceeds
+    settings.REQUEST_QUERY_BUDGET. Queries are counted by count_queries
+    through current_stats, so under ASGI those of views run in other
+    threads are counted as well.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets the handler await the middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.acall(request)
+        stats = QueryStats()
+        request.render_time = 0
+        started = time.perf_counter()
+        token = current_stats.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.record(request, response, stats,
+                           time.perf_counter() - started)
+
+    async def acall(self, request):
+        stats = QueryStats()
+        request.render_time = 0
+        started = time.perf_counter()
+        token = current_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        return self.record(request, response, stats,
+                           time.perf_counter() - started)
+
+    @staticmethod
+    def record(request, response, stats, duration):
+        route = (request.resolver_match.view_name
+                 if request.resolver_match else 'unresolved')
+        size = 0 if response.streaming else len(response.content)
+        registry.observe(route, request.method, {
+            'request_duration_seconds': duration,
+            'request_db_seconds': stats.duration,
+            'request_serialize_seconds': stats.serialize,
+            'request_render_seconds': request.render_time,
+            'request_queries': stats.count,
+            'response_size_bytes': size,
+        })
+        response['Server-Timing'] = ', '.join((
+            f'db;dur={stats.duration * 1000:.1f};desc="{stats.count} queries"',
+            f'serialize;dur={stats.serialize * 1000:.1f}',
+            'app;dur={:.1f}'.format((duration - stats.duration
+                                     - stats.serialize
+                                     - request.render_time) * 1000),
+            f'render;dur={request.render_time * 1000:.1f}',
+            f'total;dur={duration * 1000:.1f}',
+        ))
+        if stats.count > settings.REQUEST_QUERY_BUDGET:
+            logger.warning('%s %s (%s): %s queries, budget %s',
+                           request.method, request.path, route, stats.count,
+                           settings.REQUEST_QUERY_BUDGET)
+        return response
+
+    def process_template_response(self, request, response):
+        if response.is_rendered:
+            return response
+        started = time.perf_counter()
+
+        def rendered(response):
+            request.render_time = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+def metrics_allowed(request):
+    """Staff users and the bearer token of settings.METRICS_TOKEN."""
+    if request.user.is_staff:
+        return True
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION',
+                                        '').partition(' ')
+    return bool(settings.METRICS_TOKEN and scheme.lower() == 'bearer'
+                and hmac.compare_digest(token.encode(),
+                                        settings.METRICS_TOKEN.encode()))
+
+
+def metrics(request):
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.exposition(),
+                        content_type='text/plain; version=0.0.4')
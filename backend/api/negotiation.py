@@ -0,0 +1,13 @@
+from rest_framework.negotiation import BaseContentNegotiation
+
+
+class ExportContentNegotiation(BaseContentNegotiation):
+    """
+    Ignore ?format= so it can select the export format of a file
+    instead of a renderer.
+    """
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
@@ -1,5 +1,149 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import ValidationError as FieldValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class MyPagination(PageNumberPagination):
+    """
+    Page number pagination by default. With ?cursor= (empty for the first
+    page) switches to keyset pagination over the ordering of the
+    queryset, or view.cursor_ordering when it has none: no OFFSET and no
+    COUNT(*), the response has only next and results. Lists are always
+    paged by number.
+    """
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    cursor_ordering = ('id',)
+    invalid_cursor_message = 'Неверный курсор.'
+    unsupported_ordering_message = ('Курсор недоступен для этой '
+                                    'сортировки, используйте page.')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = (self.cursor_query_param in request.query_params
+                            and not isinstance(queryset, list))
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        ordering = self.queryset_ordering(queryset)
+
+        def fetch(position, count):
+            ordered = queryset.order_by(*self.ordering)
+            if position:
+                ordered = ordered.filter(self.after(position))
+            return list(ordered[:count])
+
+        return self.paginate_keyset(fetch, request, view, ordering,
+                                    queryset.model)
+
+    def queryset_ordering(self, queryset):
+        """
+        :return: explicit ordering of the queryset ending with the
+            primary key, None if it has none
+        """
+        ordering = list(queryset.query.order_by)
+        if not ordering:
+            return None
+        fields = {field.attname for field in queryset.model._meta.fields}
+        fields.add('pk')
+        for field in ordering:
+            # Annotations such as the search rank have no stable value
+            if not isinstance(field, str) or field.lstrip('-') not in fields:
+                raise ValidationError(
+                    {self.cursor_query_param:
+                        self.unsupported_ordering_message})
+        if ordering[-1].lstrip('-') not in ('pk', 'id'):
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+        return tuple(ordering)
+
+    def paginate_keyset(self, fetch, request, view=None, ordering=None,
+                        model=None):
+        """
+        Keyset pagination of results that are not a single queryset.
+        :param fetch: function of (position of the last object seen or
+            None, count) returning up to count next objects in ordering
+        :param ordering: view.cursor_ordering by default
+        :param model: model with the fields of ordering, the model of
+            view.queryset by default
+        :return: page
+        """
+        self.cursor_mode = True
+        self.request = request
+        self.ordering = ordering or getattr(view, 'cursor_ordering',
+                                            self.cursor_ordering)
+        page_size = self.get_page_size(request)
+        page = fetch(self.decode_cursor(request,
+                                        model or view.queryset.model),
+                     page_size + 1)
+        self.next_position = (self.get_position(page[page_size - 1])
+                              if len(page) > page_size else None)
+        return page[:page_size]
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if self.next_position is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(),
+                                   self.cursor_query_param,
+                                   self.encode_cursor(self.next_position))
+
+    def get_position(self, obj):
+        position = []
+        for field in self.ordering:
+            value = getattr(obj, field.lstrip('-'))
+            position.append(value.isoformat()
+                            if hasattr(value, 'isoformat') else value)
+        return position
+
+    def after(self, position):
+        """Rows strictly after position in cursor_ordering."""
+        query = Q()
+        for index, field in enumerate(self.ordering):
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = {name.lstrip('-'): value for name, value in zip(
+                self.ordering[:index], position[:index])}
+            condition[f'{field.lstrip("-")}__{lookup}'] = position[index]
+            query |= Q(**condition)
+        return query
+
+    @staticmethod
+    def encode_cursor(position):
+        return base64.urlsafe_b64encode(
+            json.dumps(position).encode()).decode()
+
+    def decode_cursor(self, request, model):
+        """:return: values of the ordering fields of model, or None"""
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if (not isinstance(position, list)
+                or len(position) != len(self.ordering)):
+            raise NotFound(self.invalid_cursor_message)
+        values = []
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            field = (model._meta.pk if name == 'pk'
+                     else model._meta.get_field(name))
+            try:
+                value = field.to_python(value)
+            except (FieldValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            if value is None:
+                raise NotFound(self.invalid_cursor_message)
+            values.append(value)
+        return values
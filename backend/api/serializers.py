@@ -1,9 +1,18 @@
+import math
+
 from django.contrib.auth import get_user_model
+from django.db import transaction
 from drf_base64.fields import Base64ImageField
 from rest_framework import serializers, status
 
-from recipes.models import (Favorites, Follow, IngredientCount, Ingredients,
-                            Recipes, ShoppingCart, Tags)
+from recipes.cart import recipe_amounts, recipe_ingredients_replaced
+from recipes.images import (ImageTooLarge, decode_base64,
+                            schedule_recipe_image, thumbnail_urls)
+from recipes.models import (MIN_INGREDIENT_COUNT, Favorites, Follow,
+                            IngredientCount, Ingredients, Recipes,
+                            ShoppingCart, ShoppingCartTotal, Tags)
+from recipes.search import schedule_update
+from recipes.signals import recipe_ingredients_changed
 
 User = get_user_model()
 User._meta.get_field('email')._unique = True
@@ -16,6 +25,35 @@ def is_true(self, model, **kwargs):
                                      **kwargs).exists())
 
 
+class RecipeImageField(Base64ImageField):
+    """Base64 image decoded in chunks to a temporary file with size
+    limits (recipes.images.decode_base64); re-encoded after saving."""
+    def _decode(self, data):
+        if isinstance(data, str) and data.startswith('data:'):
+            try:
+                return decode_base64(data)
+            except ImageTooLarge as error:
+                raise serializers.ValidationError(str(error))
+            except (ValueError, OSError):
+                self.fail('invalid_image')
+        return super()._decode(data)
+
+
+class ThumbnailsMixin:
+    """Adds get_thumbnails for a SerializerMethodField; the image is
+    taken from image_source of the serialized object."""
+    image_source = 'image'
+
+    def get_thumbnails(self, obj):
+        for attr in self.image_source.split('.'):
+            obj = getattr(obj, attr)
+        if not obj:
+            return None
+        request = self.context.get('request')
+        return {size: request.build_absolute_uri(url) if request else url
+                for size, url in thumbnail_urls(obj).items()}
+
+
 class UserSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField('subscribed',
                                                       read_only=True)
@@ -25,6 +63,8 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
     def subscribed(self, user):
+        if hasattr(user, 'is_subscribed'):
+            return user.is_subscribed
         return is_true(self, Follow, author=user)
 
     class Meta:
@@ -68,23 +108,15 @@ class IngredientRecipesSerializer(serializers.ModelSerializer):
     amount = serializers.FloatField(
         source='count',
         required=True)
-    recipe = serializers.PrimaryKeyRelatedField(queryset=Recipes.objects.all(),
-                                                write_only=True)
-
-    def validate_amount(self, amount):
-        if amount <= 0:
-            raise serializers.ValidationError(
-                'Количество ингредиентов не может быть меньше 0',
-                code=status.HTTP_400_BAD_REQUEST)
-        return amount
 
     class Meta:
         model = IngredientCount
-        fields = ('id', 'name', 'measurement_unit', 'amount', 'recipe')
+        fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipesSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+class RecipesSerializer(ThumbnailsMixin, serializers.ModelSerializer):
+    image = RecipeImageField()
+    thumbnails = serializers.SerializerMethodField()
     tags = TagSerializer(source='tag', many=True, read_only=True)
     ingredients = IngredientRecipesSerializer(many=True,
                                               source='ingredientcount_set',
@@ -96,23 +128,67 @@ class RecipesSerializer(serializers.ModelSerializer):
         'in_shopping_cart', read_only=True)
 
     def in_shopping_cart(self, recipe):
+        if hasattr(recipe, 'is_in_shopping_cart'):
+            return recipe.is_in_shopping_cart
         return is_true(self, ShoppingCart, recipe=recipe)
 
     def favorited(self, recipe):
+        if hasattr(recipe, 'is_favorited'):
+            return recipe.is_favorited
         return is_true(self, Favorites, recipe=recipe)
 
     def check_ingredients(self, method='create'):
         """
         :param method: create or update
-        :return: ingredients list
+        :return: dict {ingredient id: amount}
         """
         ingredients = self.initial_data.pop('ingredients', [])
+        if not isinstance(ingredients, list):
+            raise serializers.ValidationError(
+                {'ingredients': 'Ожидается список из id и amount.'},
+                code=status.HTTP_400_BAD_REQUEST
+            )
         if not ingredients and method == 'create':
             raise serializers.ValidationError(
                 {'ingredients': 'Обязательное поле.'},
                 code=status.HTTP_400_BAD_REQUEST
             )
-        return ingredients
+        amounts = {}
+        for ingredient in ingredients:
+            try:
+                ingredient_id = ingredient['id']
+                amount = float(ingredient['amount'])
+                if isinstance(ingredient_id, str) and ingredient_id.isdigit():
+                    ingredient_id = int(ingredient_id)
+                if (not isinstance(ingredient_id, int)
+                        or isinstance(ingredient_id, bool)):
+                    raise ValueError(ingredient_id)
+            except (KeyError, TypeError, ValueError):
+                raise serializers.ValidationError(
+                    {'ingredients': 'Ожидается список из id и amount.'},
+                    code=status.HTTP_400_BAD_REQUEST
+                )
+            if ingredient_id in amounts:
+                raise serializers.ValidationError(
+                    {'ingredients': 'Ингредиенты не должны повторяться.'},
+                    code=status.HTTP_400_BAD_REQUEST
+                )
+            if not math.isfinite(amount) or amount < MIN_INGREDIENT_COUNT:
+                raise serializers.ValidationError(
+                    {'amount': 'Количество ингредиентов не может быть '
+                               f'меньше {MIN_INGREDIENT_COUNT:g}'},
+                    code=status.HTTP_400_BAD_REQUEST
+                )
+            amounts[ingredient_id] = amount
+        diff = (set(amounts)
+                - set(Ingredients.objects.filter(
+                    id__in=amounts).values_list('id', flat=True)))
+        if diff:
+            raise serializers.ValidationError(
+                {'not_found_ingredients': sorted(list(diff))},
+                code=status.HTTP_404_NOT_FOUND
+            )
+        return amounts
 
     def check_tags(self):
         """
@@ -132,60 +208,81 @@ class RecipesSerializer(serializers.ModelSerializer):
         return tags
 
     @staticmethod
-    def add_ingredients(ingredients, recipe_id):
-        for ingredient in ingredients:
-            ingredient.update({'recipe': recipe_id})
-            ingredient_serializer = IngredientRecipesSerializer(
-                data=ingredient)
-            ingredient_serializer.is_valid(raise_exception=True)
-            ingredient_serializer.save()
+    def add_ingredients(ingredients, recipe):
+        IngredientCount.objects.bulk_create(
+            IngredientCount(recipe=recipe, ingredient_id=ingredient_id,
+                            count=amount)
+            for ingredient_id, amount in ingredients.items())
 
     def create(self, validated_data):
-        ingredients = self.check_ingredients()
-        tags = self.check_tags()
-        recipe = Recipes.objects.create(**validated_data)
-        recipe.tag.add(*tags)
-        self.add_ingredients(ingredients, recipe.id)
+        try:
+            ingredients = self.check_ingredients()
+            tags = self.check_tags()
+            with transaction.atomic():
+                recipe = Recipes.objects.create(**validated_data)
+                recipe.tag.add(*tags)
+                self.add_ingredients(ingredients, recipe)
+                schedule_update(Recipes.objects.filter(pk=recipe.pk))
+                recipe_ingredients_changed(recipe.pk)
+        finally:
+            # The decoded image is a temporary file
+            validated_data['image'].close()
+        transaction.on_commit(lambda: schedule_recipe_image(recipe))
         return recipe
 
     def update(self, instance, validated_data):
-        ingredients = self.check_ingredients(method='update')
-        tags = self.check_tags()
-
-        if tags:
-            instance.tag.clear()
-            instance.tag.add(*tags)
-
-        if ingredients:
-            instance.ingredient.clear()
-            self.add_ingredients(ingredients, instance.id)
-
-        for key, value in validated_data.items():
-            setattr(instance, key, value)
-        instance.save()
+        try:
+            ingredients = self.check_ingredients(method='update')
+            tags = self.check_tags()
+
+            with transaction.atomic():
+                if tags:
+                    instance.tag.clear()
+                    instance.tag.add(*tags)
+
+                if ingredients:
+                    old_amounts = recipe_amounts(instance.pk)
+                    instance.ingredient.clear()
+                    self.add_ingredients(ingredients, instance)
+                    recipe_ingredients_changed(instance.pk)
+                    recipe_ingredients_replaced(instance.pk, old_amounts)
+
+                for key, value in validated_data.items():
+                    setattr(instance, key, value)
+                instance.save()
+                schedule_update(Recipes.objects.filter(pk=instance.pk))
+        finally:
+            if 'image' in validated_data:
+                validated_data['image'].close()
+        if 'image' in validated_data:
+            transaction.on_commit(lambda: schedule_recipe_image(instance))
         return instance
 
     class Meta:
         model = Recipes
         fields = ('id', 'tags', 'author', 'ingredients', 'name',
-                  'image', 'text', 'cooking_time', 'is_favorited',
-                  'is_in_shopping_cart')
+                  'image', 'thumbnails', 'text', 'cooking_time',
+                  'is_favorited', 'is_in_shopping_cart')
+
 
+class BestRecipeSerializer(ThumbnailsMixin, serializers.ModelSerializer):
+    image_source = 'recipe.image'
 
-class BestRecipeSerializer(serializers.ModelSerializer):
     id = serializers.PrimaryKeyRelatedField(source='recipe',
                                             queryset=Recipes.objects.all())
     name = serializers.CharField(source='recipe.name',
                                  read_only=True)
     image = serializers.ImageField(source='recipe.image',
                                    read_only=True)
+    thumbnails = serializers.SerializerMethodField()
     cooking_time = serializers.FloatField(
         source='recipe.cooking_time', read_only=True)
     user = UserSerializer(default=serializers.CurrentUserDefault(),
                           write_only=True)
 
     class Meta:
-        fields = ('id', 'name', 'image', 'cooking_time', 'user')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time',
+                  'user')
 
 
 class ShoppingCartSerializer(BestRecipeSerializer):
@@ -193,15 +290,33 @@ class ShoppingCartSerializer(BestRecipeSerializer):
         model = ShoppingCart
 
 
+class ShoppingCartTotalSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source='ingredient_id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit')
+    amount = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ShoppingCartTotal
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+
+    def get_amount(self, obj):
+        # Sums of floats updated in steps
+        return round(obj.total, 3)
+
+
 class FavoritesCartSerializer(BestRecipeSerializer):
     class Meta(BestRecipeSerializer.Meta):
         model = Favorites
 
 
-class RecipesSerializerBase(serializers.ModelSerializer):
+class RecipesSerializerBase(ThumbnailsMixin, serializers.ModelSerializer):
+    thumbnails = serializers.SerializerMethodField()
+
     class Meta:
         model = Recipes
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'thumbnails', 'cooking_time')
 
 
 class SubscriptionsSerializer(UserSerializer, serializers.ModelSerializer):
@@ -217,14 +332,18 @@ class SubscriptionsSerializer(UserSerializer, serializers.ModelSerializer):
     recipes_count = serializers.SerializerMethodField()
 
     def get_recipes_count(self, obj):
-        return obj.author.author_recipe.count()
+        stats = getattr(obj.author, 'stats', None)
+        return stats.recipes_count if stats else 0
 
     def get_recipes(self, obj):
-        recipes_limit = self.context['request'].query_params.get(
-            'recipes_limit')
-        recipes = obj.author.author_recipe.all()
-        if recipes_limit and recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj.author, 'latest_recipes'):
+            recipes = obj.author.latest_recipes
+        else:
+            recipes_limit = self.context['request'].query_params.get(
+                'recipes_limit')
+            recipes = obj.author.author_recipe.all()
+            if recipes_limit and recipes_limit.isdigit():
+                recipes = recipes[:int(recipes_limit)]
         return RecipesSerializerBase(recipes, many=True, read_only=True).data
 
     class Meta:
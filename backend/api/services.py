@@ -1,28 +1,90 @@
 import csv
+import json
 
 from django.db.models import Sum
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse
 
-from recipes.models import ShoppingCart
+from recipes.models import ShoppingCartTotal
 
+CHUNK_SIZE = 2000
 
-def get_shoping_cart(user):
-    """only for python >= 3.7!!!!"""
-    response = HttpResponse(content_type='text/csv; charset=windows-1251')
-    response['Content-Disposition'] = 'attachment; filename="buy.csv"'
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'txt': 'text/plain',
+    'json': 'application/json',
+}
+EXPORT_ENCODINGS = {
+    'utf-8': 'utf-8',
+    'cp1251': 'windows-1251',
+}
 
-    writer = csv.writer(response, delimiter=';')
+COLS = {
+    'name': 'ingredient__name',
+    'unit': 'ingredient__measurement_unit',
+    'total': 'total'
+}
 
-    cols = {
-        'name': 'recipe__ingredientcount__ingredient__name',
-        'unit': 'recipe__ingredientcount__ingredient__measurement_unit',
-        'total': 'total'
-    }
-    writer.writerow([col for col in cols.keys()])
 
-    qs = ShoppingCart.objects.filter(user=user,
-                                     recipe__ingredient__isnull=False).values(
-        cols['name'], cols['unit']).annotate(
-        total=Sum('recipe__ingredientcount__count'))
-    writer.writerows([[rec[cols[col]] for col in cols.keys()] for rec in qs])
+class Echo:
+    """File-like object for csv.writer: returns the line instead of
+    buffering it."""
+    def write(self, value):
+        return value
+
+
+def write_csv(rows):
+    writer = csv.writer(Echo(), delimiter=';')
+    yield writer.writerow(list(COLS.keys()))
+    for rec in rows:
+        yield writer.writerow([rec[COLS[col]] for col in COLS.keys()])
+
+
+def write_txt(rows):
+    for rec in rows:
+        yield '{} ({}) — {:g}\n'.format(
+            rec[COLS['name']], rec[COLS['unit']], rec[COLS['total']])
+
+
+def write_json(rows):
+    yield '['
+    for number, rec in enumerate(rows):
+        yield (',' if number else '') + json.dumps(
+            {col: rec[COLS[col]] for col in COLS.keys()},
+            ensure_ascii=False)
+    yield ']'
+
+
+WRITERS = {
+    'csv': write_csv,
+    'txt': write_txt,
+    'json': write_json,
+}
+
+
+def get_shoping_cart(user, export_format='csv', encoding='cp1251',
+                     buffered=False):
+    """
+    Stream aggregated ingredients of the user's shopping cart from the
+    totals kept by recipes.cart.
+    :param export_format: key of EXPORT_FORMATS
+    :param encoding: key of EXPORT_ENCODINGS
+    :param buffered: read the rows before streaming, for ASGI, where the
+        response is iterated in the event loop and queries are not allowed
+    :return: StreamingHttpResponse
+    """
+    charset = EXPORT_ENCODINGS[encoding]
+    # Ingredients with the same name and unit are listed once
+    qs = ShoppingCartTotal.objects.filter(user=user).values(
+        COLS['name'], COLS['unit']).annotate(
+        total=Sum('total')).order_by(COLS['name'])
+    rows = ({**rec, 'total': round(rec['total'], 3)}
+            for rec in qs.iterator(chunk_size=CHUNK_SIZE))
+    if buffered:
+        rows = list(rows)
+    response = StreamingHttpResponse(
+        (chunk.encode(charset, errors='replace')
+         for chunk in WRITERS[export_format](rows)),
+        content_type=f'{EXPORT_FORMATS[export_format]}; charset={charset}')
+    response['Content-Disposition'] = (
+        f'attachment; filename="buy.{export_format}"')
     return response
@@ -0,0 +1,117 @@
+import base64
+import io
+import shutil
+import tempfile
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import IngredientCount, Ingredients, Recipes, Tags
+
+User = get_user_model()
+
+
+def image_data():
+    """:return: small PNG as a base64 data URI"""
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), 'red').save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com',
+        password='password', first_name=username, last_name=username)
+
+
+def token_client(user=None):
+    client = APIClient()
+    if user is not None:
+        token = Token.objects.get_or_create(user=user)[0]
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return client
+
+
+def asgi_get(path, **headers):
+    """
+    GET through the ASGI application of foodgram.asgi, as uvicorn serves
+    it: streaming responses are iterated in the event loop.
+    :param headers: header name: value
+    :return: (status, {header name: value}, body)
+    """
+    from foodgram.asgi import application
+
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    path, _, query = path.partition('?')
+    headers = {'host': 'testserver', **headers}
+    async_to_sync(application)({
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path,
+        'query_string': query.encode(), 'root_path': '',
+        'headers': [(name.lower().encode(), value.encode())
+                    for name, value in headers.items()],
+        'client': ('127.0.0.1', 1), 'server': ('testserver', 80),
+    }, receive, send)
+    start = messages[0]
+    return (start['status'],
+            {name.decode().lower(): value.decode()
+             for name, value in start['headers']},
+            b''.join(message.get('body', b'') for message in messages[1:]))
+
+
+def create_recipes(author, count, tags, ingredients, name='Рецепт'):
+    """Recipes with all the tags and ingredients, the last one newest."""
+    recipes = []
+    for number in range(count):
+        recipe = Recipes.objects.create(
+            author=author, name=f'{name} {number}', text='Текст',
+            cooking_time=10, image='recipe/test.png')
+        recipe.tag.set(tags)
+        IngredientCount.objects.bulk_create(
+            IngredientCount(recipe=recipe, ingredient=ingredient, count=1)
+            for ingredient in ingredients)
+        recipes.append(recipe)
+    return recipes
+
+
+class RecipeDataMixin:
+    """Test case data: users, tags, ingredients; media in a temporary
+    directory and fast password hashing."""
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_settings = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+        cls.media_settings.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_settings.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('user')
+        cls.author = create_user('author')
+        cls.tags = [Tags.objects.create(name=f'Тег {number}',
+                                        slug=f'tag{number}', color='#fff')
+                    for number in range(3)]
+        cls.ingredients = [
+            Ingredients.objects.create(name=f'Ингредиент {number}',
+                                       measurement_unit='г')
+            for number in range(5)]
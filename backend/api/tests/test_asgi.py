@@ -0,0 +1,57 @@
+import json
+import re
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .fixtures import (RecipeDataMixin, asgi_get, create_recipes,
+                       token_client)
+from recipes.models import ShoppingCart
+
+
+class AsgiTest(RecipeDataMixin, TestCase):
+    """Requests through foodgram.asgi, served with SERVER_APP=asgi."""
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for recipe in create_recipes(cls.author, 2, cls.tags,
+                                     cls.ingredients[:3]):
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def get(self, path):
+        from rest_framework.authtoken.models import Token
+
+        token = Token.objects.get_or_create(user=self.user)[0]
+        return asgi_get(path, authorization=f'Token {token.key}')
+
+    def test_download_shopping_cart(self):
+        status, headers, body = self.get(
+            '/api/recipes/download_shopping_cart/?format=json'
+            '&encoding=utf-8')
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body), [
+            {'name': ingredient.name,
+             'unit': ingredient.measurement_unit, 'total': 2}
+            for ingredient in self.ingredients[:3]])
+
+    def test_download_shopping_cart_wsgi(self):
+        """Under WSGI the rows are read while streaming."""
+        response = token_client(self.user).get(
+            '/api/recipes/download_shopping_cart/?format=json'
+            '&encoding=utf-8')
+        with CaptureQueriesContext(connection) as queries:
+            body = b''.join(response.streaming_content)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(len(json.loads(body)), 3)
+
+    def test_query_count(self):
+        """Queries of views without AsyncReadMixin are counted too."""
+        status, headers, _ = self.get('/api/users/me/')
+        self.assertEqual(status, 200)
+        queries = re.search(r'desc="(\d+) queries"',
+                            headers['server-timing']).group(1)
+        response = self.client.get('/api/users/me/', HTTP_AUTHORIZATION=(
+            f'Token {self.user.auth_token.key}'))
+        self.assertIn(f'desc="{queries} queries"', response['Server-Timing'])
+        self.assertNotEqual(queries, '0')
@@ -0,0 +1,115 @@
+from django.test import TestCase, override_settings
+
+from .fixtures import (RecipeDataMixin, create_recipes, create_user,
+                       token_client)
+from recipes.models import AuthorStats, FeedEntry, Follow, Recipes
+
+
+@override_settings(FEED_FANOUT_MAX_FOLLOWERS=1)
+class FeedTest(RecipeDataMixin, TestCase):
+    """Authors with more than one follower are read at request time."""
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = create_user('other')
+        cls.popular = create_user('popular')
+
+    def setUp(self):
+        self.client = token_client(self.user)
+
+    def create(self, author, count=1):
+        return [recipe.pk for recipe in create_recipes(
+            author, count, self.tags[:1], self.ingredients[:1],
+            name=author.username)]
+
+    def feed(self, user=None, limit=3):
+        """:return: recipe ids of all cursor pages of the feed"""
+        client = token_client(user) if user else self.client
+        ids = []
+        url = f'/api/users/feed/?limit={limit}&cursor='
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            ids += [row['id'] for row in response.json()['results']]
+            url = response.json()['next']
+        return ids
+
+    @staticmethod
+    def entries(user):
+        return set(FeedEntry.objects.filter(user=user).values_list(
+            'recipe', flat=True))
+
+    def test_fan_out(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        recipes = self.create(self.author, 2)
+        self.assertEqual(self.entries(self.user), set(recipes))
+        self.assertEqual(self.feed(), recipes[::-1])
+
+    def test_backfill(self):
+        recipes = self.create(self.author, 4)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.feed(), recipes[::-1])
+
+    @override_settings(FEED_MAX_ENTRIES=2)
+    def test_backfill_trimmed(self):
+        recipes = self.create(self.author, 4)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(self.entries(self.user), set(recipes[2:]))
+
+    def test_unfollow(self):
+        self.create(self.author, 2)
+        Follow.objects.create(user=self.user, author=self.author)
+        other = self.create(self.other, 2)
+        Follow.objects.create(user=self.user, author=self.other)
+        Follow.objects.get(user=self.user, author=self.author).delete()
+        self.assertEqual(self.entries(self.user), set(other))
+        self.assertEqual(self.feed(), other[::-1])
+
+    def test_popular_author_merge(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.user, author=self.popular)
+        Follow.objects.create(user=self.other, author=self.popular)
+        recipes = []
+        for _ in range(3):
+            recipes += self.create(self.author) + self.create(self.popular)
+        self.assertEqual(self.entries(self.user),
+                         set(recipes[::2]))
+        self.assertEqual(self.feed(limit=2), recipes[::-1])
+        self.assertEqual(self.feed(self.other), recipes[1::2][::-1])
+
+    def test_threshold_crossing(self):
+        before = self.create(self.author, 2)
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        # Popular now: entries are dropped, new recipes are not copied
+        self.assertEqual(self.entries(self.user), set())
+        during = self.create(self.author, 2)
+        self.assertEqual(self.feed(), (before + during)[::-1])
+        Follow.objects.get(user=self.other, author=self.author).delete()
+        self.assertEqual(self.entries(self.user), set(before + during))
+        self.assertEqual(self.feed(), (before + during)[::-1])
+        self.assertEqual(self.feed(self.other), [])
+
+    def test_follow_while_popular(self):
+        Follow.objects.create(user=self.other, author=self.author)
+        Follow.objects.create(user=self.popular, author=self.author)
+        recipes = self.create(self.author, 2)
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.get(user=self.popular, author=self.author).delete()
+        Follow.objects.get(user=self.other, author=self.author).delete()
+        self.assertEqual(self.entries(self.user), set(recipes))
+        self.assertEqual(self.feed(), recipes[::-1])
+
+    def test_deleted_recipe(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        recipes = self.create(self.author, 2)
+        Recipes.objects.filter(pk=recipes[0]).delete()
+        self.assertEqual(self.feed(), recipes[1:])
+
+    def test_follow_older_than_counters(self):
+        Follow.objects.bulk_create([Follow(user=self.user,
+                                           author=self.author)])
+        AuthorStats.objects.create(author=self.author)
+        Follow.objects.get(user=self.user, author=self.author).delete()
+        self.assertEqual(AuthorStats.objects.get(
+            author=self.author).followers_count, 0)
@@ -0,0 +1,82 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.db.backends.postgresql.base import DatabaseWrapper
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api.filters import IngredientSearchFilter
+from recipes.models import Ingredients
+
+
+class IngredientSearchTest(TestCase):
+    max_results = IngredientSearchFilter.max_results
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredients.objects.bulk_create(
+            [Ingredients(name=name, measurement_unit='г') for name in (
+                'соль', 'морская соль', 'соль морская', 'фасоль',
+                'Salt', 'sea salt', 'сода', 'сахар')]
+            + [Ingredients(name=f'сахар {number:02}', measurement_unit='г')
+               for number in range(cls.max_results + 5)]
+            # Lowercased these interleave, by name all Pepper come first
+            + [Ingredients(name=f'{name} {number:02}', measurement_unit='г')
+               for name in ('pepper', 'Pepper')
+               for number in range(cls.max_results // 2 + 5)])
+
+    def search(self, term):
+        response = self.client.get('/api/ingredients/', {'name': term})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['name'] for row in response.json()]
+
+    def test_prefix_first(self):
+        self.assertEqual(self.search('соль'), [
+            'соль', 'соль морская', 'морская соль', 'фасоль'])
+        self.assertEqual(self.search('SAL'), ['Salt', 'sea salt'])
+        self.assertEqual(self.search('перец'), [])
+
+    def test_prefix_query_only(self):
+        with CaptureQueriesContext(connection) as queries:
+            names = self.search('сах')
+        self.assertEqual(names, ['сахар'] + [
+            f'сахар {number:02}' for number in range(self.max_results - 1)])
+        self.assertEqual(len(queries), 1)
+        self.assertIn('LIKE', queries[0]['sql'])
+
+    def test_postgresql_sql(self):
+        """The predicates the indexes of recipes.signals can serve."""
+        postgresql = DatabaseWrapper(
+            {**connection.settings_dict,
+             'ENGINE': 'django.db.backends.postgresql'}, 'postgresql')
+        search = IngredientSearchFilter()
+        with mock.patch('api.filters.connection', postgresql):
+            prefix = search.prefix_search(Ingredients.objects.all(), 'Соль')
+        sql, params = prefix.query.get_compiler(
+            connection=postgresql).as_sql()
+        self.assertIn('WHERE LOWER("recipes_ingredients"."name")::text '
+                      'LIKE %s', sql)
+        self.assertEqual(params, ('соль%',))
+        queryset = search.postgres_search(Ingredients.objects.all(), 'соль')
+        sql, params = queryset.query.get_compiler(
+            connection=postgresql).as_sql()
+        where = sql[sql.index(' WHERE '):]
+        self.assertIn('LOWER("recipes_ingredients"."name") %% %s', where)
+        self.assertIn('SIMILARITY(LOWER("recipes_ingredients"."name"), %s) '
+                      '>= %s', where)
+        self.assertEqual(params[-1], search.trigram_threshold)
+
+    def test_prefix_index(self):
+        """The index returns what the filter does."""
+        for term in ('сах', 'сахар 0', 'соль', 'pep', 'PEPPER 1', 'Sa',
+                     'перец'):
+            with self.subTest(term=term):
+                cache.clear()
+                expected = self.client.get('/api/ingredients/',
+                                           {'name': term}).json()
+                cache.clear()
+                with override_settings(INGREDIENTS_PREFIX_INDEX=True):
+                    response = self.client.get('/api/ingredients/',
+                                               {'name': term})
+                self.assertEqual(response.json(), expected)
@@ -0,0 +1,85 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from .fixtures import RecipeDataMixin, create_recipes, token_client
+from api.matching import RecipeIngredientIndex
+from recipes.signals import reset_recipe_changes
+
+
+class RecipeMatchingTest(RecipeDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        first, second, third, fourth = cls.ingredients[:4]
+        cls.two, cls.four, cls.other, cls.newest = [
+            create_recipes(cls.author, 1, cls.tags[:1], ingredients)[0]
+            for ingredients in ([first, second],
+                                [first, second, third, fourth],
+                                [third], [first])]
+
+    def setUp(self):
+        # Rebuild the indexes on the data of this test
+        reset_recipe_changes()
+        self.client = token_client(self.user)
+        self.have = [ingredient.pk for ingredient in self.ingredients[:2]]
+
+    def get(self, query):
+        return self.client.get(f'/api/recipes/by_ingredients/?{query}')
+
+    def test_ranking(self):
+        response = self.get('ingredients=' + ','.join(map(str, self.have)))
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(
+            [(row['id'], row['coverage'], row['missing'])
+             for row in response.json()['results']],
+            [(self.newest.pk, 1, 0), (self.two.pk, 1, 0),
+             (self.four.pk, 0.5, 2)])
+
+    def test_max_missing(self):
+        query = 'ingredients={}&ingredients={}'.format(*self.have)
+        for max_missing, expected in (
+                (0, [self.newest.pk, self.two.pk]),
+                (2, [self.newest.pk, self.two.pk, self.four.pk])):
+            response = self.get(f'{query}&max_missing={max_missing}')
+            self.assertEqual([row['id'] for row in response.json()[
+                'results']], expected)
+
+    def test_invalid(self):
+        for query, field in (('ingredients=a', 'ingredients'),
+                             ('ingredients=1,', 'ingredients'),
+                             ('', 'ingredients'),
+                             ('ingredients=1&max_missing=-1', 'max_missing'),
+                             ('ingredients=1&max_missing=x', 'max_missing')):
+            response = self.get(query)
+            self.assertEqual(response.status_code, 400, query)
+            self.assertIn(field, response.json())
+
+    def test_unknown_ingredient(self):
+        response = self.get('ingredients=999999')
+        self.assertEqual(response.json()['results'], [])
+
+    def test_patched_after_changes(self):
+        index = RecipeIngredientIndex()
+        index.sync()
+        fifth = self.ingredients[4]
+        client = token_client(self.author)
+        with mock.patch.object(index, 'build',
+                               side_effect=AssertionError('rebuilt')):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = client.patch(
+                    f'/api/recipes/{self.four.pk}/',
+                    {'ingredients': [{'id': self.have[0], 'amount': 1},
+                                     {'id': fifth.pk, 'amount': 1}]},
+                    format='json')
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(index.match([fifth.pk]),
+                             [(self.four.pk, 0.5, 1)])
+            self.assertEqual(index.match(self.have)[-1],
+                             (self.four.pk, 0.5, 1))
+            with self.captureOnCommitCallbacks(execute=True):
+                self.newest.delete()
+            self.assertEqual(
+                [row[0] for row in index.match(self.have)],
+                [self.two.pk, self.four.pk])
+        self.assertNotIn(self.newest.pk, index.recipes)
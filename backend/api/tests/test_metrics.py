@@ -0,0 +1,107 @@
+import re
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from .fixtures import (RecipeDataMixin, create_recipes, create_user,
+                       token_client)
+from api.metrics import Registry
+
+
+@override_settings(METRICS_TOKEN='secret')
+class MetricsAccessTest(TestCase):
+    url = '/api/metrics/'
+
+    def test_anonymous(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_user(self):
+        self.client.force_login(create_user('user'))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_staff(self):
+        user = create_user('staff')
+        user.is_staff = True
+        user.save()
+        self.client.force_login(user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'foodgram_request_duration_seconds', response.content)
+
+    def test_token(self):
+        for header, status in (('Bearer secret', 200), ('Bearer wrong', 403),
+                               ('Token secret', 403), ('Bearer ', 403)):
+            response = self.client.get(self.url, HTTP_AUTHORIZATION=header)
+            self.assertEqual(response.status_code, status, header)
+
+    @override_settings(METRICS_TOKEN='')
+    def test_no_token_configured(self):
+        response = self.client.get(self.url, HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 403)
+
+
+class RequestMetricsTest(RecipeDataMixin, TestCase):
+    route = 'api:recipes-list'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        create_recipes(cls.author, 5, cls.tags, cls.ingredients)
+
+    def setUp(self):
+        patcher = mock.patch('api.metrics.registry', Registry())
+        self.registry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get(self):
+        client = token_client(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def histogram(self, metric):
+        return self.registry.histograms[(metric, self.route, 'GET')]
+
+    def test_histograms(self):
+        response, queries = self.get()
+        self.assertEqual(self.histogram('request_queries').sum, queries)
+        self.assertEqual(self.histogram('response_size_bytes').sum,
+                         len(response.content))
+        for metric in ('request_duration_seconds', 'request_db_seconds',
+                       'request_serialize_seconds', 'request_render_seconds'):
+            self.assertEqual(self.histogram(metric).count, 1, metric)
+            self.assertGreater(self.histogram(metric).sum, 0, metric)
+        exposition = self.registry.exposition()
+        labels = f'route="{self.route}",method="GET"'
+        self.assertIn(f'foodgram_request_queries_count{{{labels}}} 1',
+                      exposition)
+        self.assertIn(f'foodgram_request_queries_bucket{{{labels},le="+Inf"}}'
+                      f' 1', exposition)
+
+    def test_server_timing(self):
+        response, queries = self.get()
+        timings = {name: float(duration) for name, duration in re.findall(
+            r'(\w+);dur=([\d.-]+)', response['Server-Timing'])}
+        self.assertEqual(set(timings),
+                         {'db', 'serialize', 'app', 'render', 'total'})
+        self.assertIn(f'desc="{queries} queries"', response['Server-Timing'])
+        self.assertGreater(timings['serialize'], 0)
+        # The SQL of the serializers is not counted twice
+        self.assertGreaterEqual(timings['app'], 0)
+        self.assertAlmostEqual(
+            timings['db'] + timings['serialize'] + timings['app']
+            + timings['render'], timings['total'], delta=0.5)
+
+    def test_query_budget(self):
+        with override_settings(REQUEST_QUERY_BUDGET=1), \
+                self.assertLogs('api.metrics', 'WARNING') as logs:
+            _, queries = self.get()
+        self.assertIn(f'GET /api/recipes/ ({self.route}): {queries} queries, '
+                      f'budget 1', logs.output[0])
+        with override_settings(REQUEST_QUERY_BUDGET=queries), \
+                mock.patch('api.metrics.logger') as logger:
+            self.get()
+        logger.warning.assert_not_called()
@@ -0,0 +1,67 @@
+import base64
+import json
+
+from django.test import TestCase
+
+from .fixtures import RecipeDataMixin, create_recipes, token_client
+from recipes.models import Recipes
+
+
+class CursorPaginationTest(RecipeDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        recipes = create_recipes(cls.author, 12, cls.tags[:1],
+                                 cls.ingredients[:1])
+        for number, recipe in enumerate(recipes):
+            Recipes.objects.filter(pk=recipe.pk).update(
+                favorites_count=number * 7 % 5)
+
+    def setUp(self):
+        self.client = token_client()
+
+    def walk(self, query):
+        """:return: recipe ids of all cursor pages"""
+        ids = []
+        url = f'/api/recipes/?{query}&limit=5&cursor='
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, response.content)
+            data = response.json()
+            ids += [row['id'] for row in data['results']]
+            url = data['next']
+        return ids
+
+    def pages(self, query):
+        return [row['id'] for row in self.client.get(
+            f'/api/recipes/?{query}&limit=50').json()['results']]
+
+    def test_default_ordering(self):
+        self.assertEqual(self.walk('author=' + str(self.author.pk)),
+                         self.pages('author=' + str(self.author.pk)))
+
+    def test_popular_ordering(self):
+        expected = list(Recipes.objects.order_by(
+            '-favorites_count', '-pub_date', '-id').values_list(
+            'id', flat=True))
+        self.assertEqual(self.pages('ordering=popular'), expected)
+        self.assertEqual(self.walk('ordering=popular'), expected)
+
+    def test_search_rank_ordering(self):
+        response = self.client.get('/api/recipes/?search=Рецепт&cursor=')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json())
+
+    def test_malformed_cursor(self):
+        self.client = token_client(self.user)
+        for position in (['bad', 1], [None, None],
+                         ['2026-01-01T00:00:00', 'x'], [{}, 'x'], [1],
+                         'x', {'a': 1}):
+            cursor = base64.urlsafe_b64encode(
+                json.dumps(position).encode()).decode()
+            for url in ('/api/recipes/', '/api/users/feed/'):
+                response = self.client.get(f'{url}?cursor={cursor}')
+                self.assertEqual(response.status_code, 404,
+                                 (url, position))
+        response = self.client.get('/api/recipes/?cursor=%%%')
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,38 @@
+from django.test import TestCase
+
+from .fixtures import RecipeDataMixin, create_recipes, token_client
+from recipes.models import Favorites, Recipes
+
+
+class RecipeCountersTest(RecipeDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipe = create_recipes(cls.author, 1, cls.tags[:1],
+                                    cls.ingredients[:1])[0]
+
+    def setUp(self):
+        self.client = token_client(self.user)
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def counters(self):
+        return Recipes.objects.values_list(
+            'favorites_count', 'shopping_cart_count').get(pk=self.recipe.pk)
+
+    def test_counters(self):
+        for action in ('favorite', 'shopping_cart'):
+            response = self.client.post(self.url + action + '/')
+            self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.counters(), (1, 1))
+        for action in ('favorite', 'shopping_cart'):
+            response = self.client.delete(self.url + action + '/')
+            self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.counters(), (0, 0))
+
+    def test_rows_older_than_counters(self):
+        # bulk_create sends no signals, as data loaded before the counters
+        Favorites.objects.bulk_create(
+            [Favorites(user=self.user, recipe=self.recipe)])
+        response = self.client.delete(self.url + 'favorite/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.counters(), (0, 0))
@@ -0,0 +1,68 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .fixtures import RecipeDataMixin, create_recipes, token_client
+from recipes.models import Favorites, ShoppingCart
+
+
+class RecipeFiltersTest(RecipeDataMixin, TestCase):
+    """Flag and tag filters are EXISTS subqueries: no joins multiplying
+    recipe rows, so no DISTINCT."""
+    query = 'is_favorited=1&is_in_shopping_cart=1&tags=tag0&tags=tag1'
+    subquery_tables = ('recipes_favorites', 'recipes_shoppingcart',
+                       'recipes_recipes_tag')
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        recipes = create_recipes(cls.author, 10, cls.tags, cls.ingredients)
+        cls.expected = [recipe.pk for recipe in reversed(recipes[::3])]
+        for recipe in recipes[::3]:
+            Favorites.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        ShoppingCart.objects.create(user=cls.user, recipe=recipes[1])
+
+    def recipe_queries(self):
+        """:return: SQL of the count and page queries of the list"""
+        client = token_client(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(f'/api/recipes/?{self.query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual([row['id'] for row in response.json()['results']],
+                         self.expected)
+        return [query['sql'] for query in queries
+                if query['sql'].startswith(('SELECT COUNT(*)',
+                                            'SELECT "recipes_recipes"'))]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+            return [' '.join(map(str, row)) for row in cursor.fetchall()]
+
+    def test_sql(self):
+        queries = self.recipe_queries()
+        self.assertEqual(len(queries), 2, queries)
+        for sql in queries:
+            self.assertNotIn('DISTINCT', sql)
+            where = sql[sql.index(' WHERE '):]
+            for table in self.subquery_tables:
+                self.assertIn(f'EXISTS(SELECT (1) AS "a" FROM "{table}"',
+                              where)
+
+    def test_plan(self):
+        for sql in self.recipe_queries():
+            plan = self.explain(sql)
+            text = '\n'.join(plan)
+            if connection.vendor == 'postgresql':
+                self.assertNotIn('Unique', text)
+                self.assertNotIn('HashAggregate', text)
+                continue
+            self.assertNotIn('DISTINCT', text)
+            # Subqueries look their rows up by indexes, no scans
+            self.assertNotRegex(text, r'\bSCAN U\d')
+            searches = [line for line in plan if ' SEARCH U' in line]
+            self.assertGreaterEqual(len(searches),
+                                    len(self.subquery_tables), text)
+            for line in searches:
+                self.assertIn('INDEX', line)
@@ -0,0 +1,70 @@
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .fixtures import (RecipeDataMixin, create_recipes, image_data,
+                       token_client)
+from recipes.models import Favorites, Follow, ShoppingCart
+
+
+class RecipeQueriesTest(RecipeDataMixin, TestCase):
+    """Number of queries of RecipesViewSet does not grow with recipes."""
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.recipes = create_recipes(cls.author, 30, cls.tags,
+                                     cls.ingredients)
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for recipe in cls.recipes[::2]:
+            Favorites.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        self.client = token_client(self.user)
+
+    def test_list(self):
+        with self.assertNumQueries(6):
+            response = self.client.get('/api/recipes/?limit=20')
+        self.assertEqual(len(response.json()['results']), 20)
+
+    def test_list_page_size(self):
+        for client in (self.client, token_client()):
+            counts = set()
+            for limit in (1, 6, 20, 30):
+                with CaptureQueriesContext(connection) as queries:
+                    response = client.get(f'/api/recipes/?limit={limit}')
+                self.assertEqual(len(response.json()['results']), limit)
+                counts.add(len(queries))
+            self.assertEqual(len(counts), 1, counts)
+
+    def test_retrieve(self):
+        with self.assertNumQueries(5):
+            response = self.client.get(f'/api/recipes/{self.recipes[0].pk}/')
+        data = response.json()
+        self.assertTrue(data['is_favorited'])
+        self.assertTrue(data['author']['is_subscribed'])
+        self.assertEqual(len(data['ingredients']), len(self.ingredients))
+
+    def test_create(self):
+        with self.assertNumQueries(20):
+            response = self.client.post('/api/recipes/', {
+                'name': 'Новый', 'text': 'Текст', 'cooking_time': 5,
+                'image': image_data(),
+                'tags': [tag.pk for tag in self.tags],
+                'ingredients': [{'id': ingredient.pk, 'amount': 2}
+                                for ingredient in self.ingredients],
+            }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_partial_update(self):
+        recipe = self.recipes[0]
+        client = token_client(self.author)
+        with self.assertNumQueries(22):
+            response = client.patch(
+                f'/api/recipes/{recipe.pk}/', {
+                    'name': 'Изменён', 'text': 'Текст', 'cooking_time': 5,
+                    'tags': [self.tags[0].pk],
+                    'ingredients': [{'id': ingredient.pk, 'amount': 3}
+                                    for ingredient in self.ingredients]},
+                format='json')
+        self.assertEqual(response.status_code, 200, response.content)
@@ -0,0 +1,81 @@
+from django.db import connection
+from django.test import TestCase
+
+from .fixtures import RecipeDataMixin, create_recipes, token_client
+from recipes.models import Ingredients, Recipes
+from recipes.search import FTS_TABLE, update_documents
+
+
+class RecipeSearchTest(RecipeDataMixin, TestCase):
+    """?search= on the FTS5 table of recipes.search (SQLite)."""
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.beet = Ingredients.objects.create(name='Свёкла',
+                                              measurement_unit='г')
+        cls.in_ingredients = create_recipes(
+            cls.author, 1, cls.tags[:1], [cls.beet], name='Винегрет')[0]
+        cls.in_text, cls.in_name, cls.other = create_recipes(
+            cls.author, 3, cls.tags[:1], cls.ingredients[:1], name='Суп')
+        Recipes.objects.filter(pk=cls.in_text.pk).update(
+            text='Нарезать: свёкла, морковь, лук и картофель')
+        Recipes.objects.filter(pk=cls.in_name.pk).update(
+            name='Свёкла печёная')
+        update_documents(Recipes.objects.all())
+
+    def setUp(self):
+        self.client = token_client(self.user)
+
+    def search(self, value):
+        response = self.client.get('/api/recipes/', {'search': value})
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['id'] for row in response.json()['results']]
+
+    def test_rank(self):
+        """Name, then text, then ingredient names."""
+        self.assertEqual(self.search('свёкла'), [
+            self.in_name.pk, self.in_text.pk, self.in_ingredients.pk])
+        # No stemming in the FTS5 tokenizer
+        self.assertEqual(self.search('свёклу'), [])
+        self.assertEqual(self.search('СВЁКЛА'), self.search('свёкла'))
+
+    def test_all_words(self):
+        self.assertEqual(self.search('свёкла печёная'), [self.in_name.pk])
+        # Words may be in different columns
+        self.assertEqual(self.search('свёкла суп'), [self.in_text.pk])
+        self.assertEqual(self.search('свёкла окрошка'), [])
+
+    def test_quotes_and_operators(self):
+        for value in ('"свёкла', 'свёкла OR суп', 'NEAR(свёкла)', '*', '-'):
+            self.search(value)
+        self.assertEqual(self.search('  '), self.search(''))
+
+    def test_recipe_updated(self):
+        client = token_client(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(f'/api/recipes/{self.other.pk}/',
+                                    {'name': 'Окрошка'}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(self.search('окрошка'), [self.other.pk])
+
+    def test_ingredient_renamed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.beet.name = 'Бурак'
+            self.beet.save()
+        self.assertEqual(self.search('бурак'), [self.in_ingredients.pk])
+        self.assertEqual(self.search('свёкла'),
+                         [self.in_name.pk, self.in_text.pk])
+
+    def test_recipe_deleted(self):
+        self.in_name.delete()
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {FTS_TABLE} WHERE rowid = '
+                           f'%s', [self.in_name.pk])
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertEqual(self.search('свёкла'),
+                         [self.in_text.pk, self.in_ingredients.pk])
+
+    def test_with_filters(self):
+        response = self.client.get(
+            '/api/recipes/', {'search': 'свёкла', 'author': self.user.pk})
+        self.assertEqual(response.json()['results'], [])
@@ -0,0 +1,50 @@
+from django.test import TestCase
+
+from .fixtures import RecipeDataMixin, image_data, token_client
+from recipes.models import Recipes
+
+
+class RecipeIngredientsValidationTest(RecipeDataMixin, TestCase):
+    def create(self, ingredients):
+        return token_client(self.author).post('/api/recipes/', {
+            'name': 'Рецепт', 'text': 'Текст', 'cooking_time': 5,
+            'image': image_data(), 'tags': [self.tags[0].pk],
+            'ingredients': ingredients}, format='json')
+
+    def test_amount_below_model_minimum(self):
+        for amount in (0.05, 0, -1, 'nan'):
+            response = self.create([{'id': self.ingredients[0].pk,
+                                     'amount': amount}])
+            self.assertEqual(response.status_code, 400, amount)
+            self.assertIn('amount', response.json())
+        self.assertFalse(Recipes.objects.exists())
+
+    def test_minimum_amount(self):
+        response = self.create([{'id': self.ingredients[0].pk,
+                                 'amount': 0.1}])
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_id_not_integer(self):
+        for ingredient_id in (1.9, '1.9', True, None, [1]):
+            response = self.create([{'id': ingredient_id, 'amount': 1}])
+            self.assertEqual(response.status_code, 400, ingredient_id)
+            self.assertIn('ingredients', response.json())
+        self.assertFalse(Recipes.objects.exists())
+
+    def test_not_a_list(self):
+        for ingredients in (5, 'abc', {'id': self.ingredients[0].pk,
+                                       'amount': 1}, None):
+            response = self.create(ingredients)
+            self.assertEqual(response.status_code, 400, ingredients)
+            self.assertIn('ingredients', response.json())
+        self.assertFalse(Recipes.objects.exists())
+
+    def test_id_as_string(self):
+        response = self.create([{'id': str(self.ingredients[0].pk),
+                                 'amount': 1}])
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def test_duplicate_ids(self):
+        response = self.create([{'id': self.ingredients[0].pk, 'amount': 1},
+                                {'id': self.ingredients[0].pk, 'amount': 2}])
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,111 @@
+import json
+
+from django.db.models import Count, Sum
+from django.test import TestCase
+
+from .fixtures import (RecipeDataMixin, create_recipes, create_user,
+                       token_client)
+from recipes.models import IngredientCount, ShoppingCart, ShoppingCartTotal
+
+
+class ShoppingCartTotalsTest(RecipeDataMixin, TestCase):
+    """ShoppingCartTotal kept by recipes.cart against a fresh aggregate."""
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.other = create_user('other')
+        first, second, third = cls.ingredients[:3]
+        cls.soup = create_recipes(cls.author, 1, cls.tags[:1],
+                                  [first, second])[0]
+        cls.salad = create_recipes(cls.author, 1, cls.tags[:1],
+                                   [second, third])[0]
+        for recipe, ingredient, count in ((cls.soup, second, 2),
+                                          (cls.salad, second, 3),
+                                          (cls.salad, third, 0.5)):
+            IngredientCount.objects.filter(
+                recipe=recipe, ingredient=ingredient).update(count=count)
+
+    def setUp(self):
+        self.client = token_client(self.user)
+
+    def cart(self, recipe, method='post', client=None):
+        response = getattr(client or self.client, method)(
+            f'/api/recipes/{recipe.pk}/shopping_cart/')
+        self.assertIn(response.status_code, (201, 204), response.content)
+
+    @staticmethod
+    def totals():
+        return {(row.user_id, row.ingredient_id): (round(row.total, 6),
+                                                   row.recipes)
+                for row in ShoppingCartTotal.objects.all()}
+
+    def assert_fresh(self):
+        """Totals equal the aggregate of the carts, rows at zero gone."""
+        expected = {
+            (row['user'], row['recipe__ingredientcount__ingredient']):
+                (round(row['total'], 6), row['recipes'])
+            for row in ShoppingCart.objects.filter(
+                recipe__ingredientcount__isnull=False).order_by().values(
+                'user', 'recipe__ingredientcount__ingredient').annotate(
+                total=Sum('recipe__ingredientcount__count'),
+                recipes=Count('recipe', distinct=True))}
+        self.assertEqual(self.totals(), expected)
+
+    def summary(self):
+        data = self.client.get('/api/recipes/shopping_cart_summary/').json()
+        return data['recipes'], {row['id']: row['amount']
+                                 for row in data['ingredients']}
+
+    def test_add_and_remove(self):
+        first, second, third = [ingredient.pk
+                                for ingredient in self.ingredients[:3]]
+        self.cart(self.soup)
+        self.cart(self.salad)
+        self.cart(self.soup, client=token_client(self.other))
+        self.assert_fresh()
+        self.assertEqual(self.summary(),
+                         (2, {first: 1, second: 5, third: 0.5}))
+        self.cart(self.soup, 'delete')
+        self.assert_fresh()
+        self.assertNotIn((self.user.pk, first), self.totals())
+        self.assertEqual(self.summary(), (1, {second: 3, third: 0.5}))
+        self.cart(self.salad, 'delete')
+        self.assertEqual(self.summary(), (0, {}))
+        self.assertEqual(set(self.totals()),
+                         {(self.other.pk, first), (self.other.pk, second)})
+
+    def test_recipe_ingredients_edited(self):
+        self.cart(self.soup)
+        self.cart(self.salad)
+        self.cart(self.salad, client=token_client(self.other))
+        third, fourth = self.ingredients[2:4]
+        response = token_client(self.author).patch(
+            f'/api/recipes/{self.salad.pk}/',
+            {'ingredients': [{'id': third.pk, 'amount': 4},
+                             {'id': fourth.pk, 'amount': 1.5}]},
+            format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assert_fresh()
+        self.assertEqual(self.summary()[1], {
+            self.ingredients[0].pk: 1, self.ingredients[1].pk: 2,
+            third.pk: 4, fourth.pk: 1.5})
+
+    def test_recipe_deleted(self):
+        self.cart(self.soup)
+        self.cart(self.salad)
+        self.salad.delete()
+        self.assert_fresh()
+        self.assertEqual(len(self.totals()), 2)
+
+    def test_export_matches_summary(self):
+        self.cart(self.soup)
+        self.cart(self.salad)
+        response = self.client.get(
+            '/api/recipes/download_shopping_cart/?format=json'
+            '&encoding=utf-8')
+        exported = json.loads(b''.join(response.streaming_content))
+        names = {ingredient.pk: ingredient.name
+                 for ingredient in self.ingredients}
+        self.assertEqual(
+            {row['name']: row['total'] for row in exported},
+            {names[pk]: amount for pk, amount in self.summary()[1].items()})
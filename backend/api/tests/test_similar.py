@@ -0,0 +1,95 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from .fixtures import RecipeDataMixin, create_recipes, token_client
+from recipes.models import Recipes
+
+
+class SimilarRecipesTest(RecipeDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        first, second, third, fourth, fifth = cls.ingredients
+        cls.recipe, cls.same, cls.close, cls.unrelated = [
+            create_recipes(cls.author, 1, tags, ingredients)[0]
+            for tags, ingredients in (
+                (cls.tags[:1], [first, second, third]),
+                (cls.tags[:1], [first, second, third]),
+                (cls.tags[:1], [first, fourth]),
+                (cls.tags[1:2], [fifth]))]
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        path_settings = override_settings(
+            SIMILAR_RECIPES_FILE=os.path.join(directory, 'similar.bin'))
+        path_settings.enable()
+        self.addCleanup(path_settings.disable)
+        self.client = token_client()
+
+    @staticmethod
+    def build(*args):
+        output = io.StringIO()
+        call_command('build_similar', '--workers', '1', '--top', '2', *args,
+                     stdout=output)
+        return output.getvalue()
+
+    def similar(self, recipe, query=''):
+        response = self.client.get(f'/api/recipes/{recipe.pk}/similar/'
+                                   f'{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [row['id'] for row in response.json()]
+
+    def test_similar(self):
+        self.build()
+        response = self.client.get(f'/api/recipes/{self.recipe.pk}/similar/')
+        self.assertEqual([(row['id'], row['similarity'])
+                          for row in response.json()][:1],
+                         [(self.same.pk, 1)])
+        self.assertEqual(self.similar(self.recipe),
+                         [self.same.pk, self.close.pk])
+        self.assertEqual(self.similar(self.unrelated), [])
+
+    def test_limit(self):
+        self.build()
+        self.assertEqual(self.similar(self.recipe, '?limit=1'),
+                         [self.same.pk])
+        self.assertEqual(self.similar(self.recipe, '?limit=0'), [])
+        for limit in ('x', '-1', '1.5'):
+            response = self.client.get(
+                f'/api/recipes/{self.recipe.pk}/similar/?limit={limit}')
+            self.assertEqual(response.status_code, 400, limit)
+            self.assertIn('limit', response.json())
+
+    def test_not_built(self):
+        self.assertEqual(self.similar(self.recipe), [])
+        response = self.client.get('/api/recipes/999999/similar/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_update(self):
+        self.build()
+        newer = create_recipes(self.author, 1, self.tags[:1],
+                               self.ingredients[:3])[0]
+        self.same.delete()
+        self.assertIn('1 of 4 recipes', self.build('--update'))
+        self.assertEqual(self.similar(newer), [self.recipe.pk,
+                                               self.close.pk])
+        # The new recipe among the neighbours of an older one, the
+        # deleted one dropped
+        self.assertEqual(self.similar(self.recipe),
+                         [newer.pk, self.close.pk])
+        self.assertEqual(self.build('--update').split(' ')[0], '0')
+
+    def test_update_top_changed(self):
+        self.build()
+        output = io.StringIO()
+        call_command('build_similar', '--workers', '1', '--top', '3',
+                     '--update', stdout=output)
+        self.assertIn('full build', output.getvalue())
+        self.assertIn(f'4 of {Recipes.objects.count()} recipes',
+                      output.getvalue())
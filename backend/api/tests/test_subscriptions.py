@@ -0,0 +1,76 @@
+import io
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from .fixtures import RecipeDataMixin, create_user, token_client
+from recipes.models import Follow, Recipes
+
+AUTHORS = 100
+RECIPES = 4
+
+
+class SubscriptionsTest(RecipeDataMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.authors = [create_user(f'author{number}')
+                       for number in range(AUTHORS)]
+        Recipes.objects.bulk_create(
+            Recipes(author=author, name=f'Рецепт {number}', text='Текст',
+                    cooking_time=10, image='recipe/test.png')
+            for author in cls.authors for number in range(RECIPES))
+        Follow.objects.bulk_create(Follow(user=cls.user, author=author)
+                                   for author in cls.authors)
+        # Bulk loads send no signals
+        call_command('recount_counters', stdout=io.StringIO())
+
+    def setUp(self):
+        self.client = token_client(self.user)
+
+    def get(self, query):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/users/subscriptions/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json(), len(queries)
+
+    def test_queries_do_not_grow_with_authors(self):
+        counts = set()
+        for limit in (1, 10, AUTHORS):
+            data, count = self.get(f'limit={limit}&recipes_limit=2')
+            self.assertEqual(len(data['results']), limit)
+            counts.add(count)
+        self.assertEqual(counts, {4})
+
+    def test_recipes_limit(self):
+        for recipes_limit, expected in (('2', 2), ('0', 0), ('', RECIPES),
+                                        ('x', RECIPES)):
+            data, _ = self.get(f'limit={AUTHORS}'
+                               f'&recipes_limit={recipes_limit}')
+            for row in data['results']:
+                self.assertEqual(len(row['recipes']), expected,
+                                 recipes_limit)
+                self.assertEqual(row['recipes_count'], RECIPES)
+
+    def test_response_shape(self):
+        data, _ = self.get('limit=1&recipes_limit=2')
+        self.assertEqual(set(data), {'count', 'next', 'previous',
+                                     'results'})
+        self.assertEqual(data['count'], AUTHORS)
+        row = data['results'][0]
+        author = self.authors[0]
+        self.assertEqual(
+            {key: value for key, value in row.items() if key != 'recipes'},
+            {'email': author.email, 'id': author.pk,
+             'username': author.username,
+             'first_name': author.first_name,
+             'last_name': author.last_name, 'is_subscribed': True,
+             'recipes_count': RECIPES})
+        latest = author.author_recipe.order_by('-pub_date', '-id')[:2]
+        self.assertEqual([recipe['id'] for recipe in row['recipes']],
+                         [recipe.pk for recipe in latest])
+        self.assertEqual(set(row['recipes'][0]),
+                         {'id', 'name', 'image', 'thumbnails',
+                          'cooking_time'})
@@ -1,6 +1,7 @@
 from django.urls import include, path, re_path
 from rest_framework import routers
 
+from .metrics import metrics
 from .views import IngredientViewSet, RecipesViewSet, TagViewSet, UserViewSet
 
 app_name = 'api'
@@ -13,6 +14,7 @@ router.register('recipes', RecipesViewSet, basename='recipes')
 
 
 urlpatterns = [
+    path('metrics/', metrics, name='metrics'),
     path('', include(router.urls)),
     re_path(r'^auth/', include('djoser.urls.authtoken')),
 ]
@@ -1,31 +1,46 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework import filters, mixins, status, viewsets
+from rest_framework import mixins, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from .filters import CustomFilter
-from recipes.models import Follow, Ingredients, Recipes, Tags
+from .async_views import AsyncReadMixin
+from .autocomplete import ingredient_index
+from .caching import CachedReferenceMixin
+from .filters import CustomFilter, IngredientSearchFilter
+from .matching import recipe_index
+from .negotiation import ExportContentNegotiation
+from recipes.feed import feed_page
+from recipes.models import (Follow, Ingredients, Recipes, ShoppingCart,
+                            Tags)
+from recipes.similar import similar_recipes
 from .paginations import MyPagination
 from .permissions import RecipesPermission, UserPermissions
 from .serializers import (FollowSerizlizer, FavoritesCartSerializer,
                           IngredientSerializer, PasswordSerializer,
                           RecipesSerializer, ShoppingCartSerializer,
+                          ShoppingCartTotalSerializer,
                           SubscriptionsSerializer, TagSerializer,
                           UserSerializer)
-from .services import get_shoping_cart
+from .services import EXPORT_ENCODINGS, EXPORT_FORMATS, get_shoping_cart
 
 User = get_user_model()
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(AsyncReadMixin, viewsets.ModelViewSet):
     queryset = User.objects.all().order_by('id')
     serializer_class = UserSerializer
     permission_classes = (UserPermissions,)
     lookup_field = 'id'
     pagination_class = MyPagination
+    cursor_ordering = ('id',)
+    async_read_actions = ('subscriptions', 'feed')
 
     @action(detail=False, methods=['GET'],
             permission_classes=[IsAuthenticated])
@@ -51,12 +66,29 @@ class UserViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['GET'],
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        qs = Follow.objects.filter(user=request.user)
+        recipes_limit = request.query_params.get('recipes_limit')
+        qs = Follow.objects.filter(user=request.user).with_recipes(
+            int(recipes_limit) if recipes_limit and recipes_limit.isdigit()
+            else None).order_by('id')
         page = self.paginate_queryset(qs)
         serializer = SubscriptionsSerializer(page, many=True,
                                              context={'request': request})
         return self.get_paginated_response(serializer.data)
 
+    @action(detail=False, methods=['GET'],
+            permission_classes=[IsAuthenticated],
+            cursor_ordering=('-pub_date', '-id'))
+    def feed(self, request):
+        """Recipes of followed authors, newest first, keyset pages."""
+        recipes = Recipes.objects.with_related(request.user)
+        page = self.paginator.paginate_keyset(
+            lambda position, count: feed_page(recipes, request.user,
+                                              position, count),
+            request, self, model=Recipes)
+        serializer = RecipesSerializer(page, many=True,
+                                       context={'request': request})
+        return self.get_paginated_response(serializer.data)
+
     @action(detail=True, methods=['POST', 'DELETE'])
     def subscribe(self, request, id):
         serializer = FollowSerizlizer(data={'author_id': id},
@@ -77,9 +109,11 @@ class UserViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
-class TagIngredients(mixins.ListModelMixin, mixins.RetrieveModelMixin,
+class TagIngredients(AsyncReadMixin, CachedReferenceMixin,
+                     mixins.ListModelMixin, mixins.RetrieveModelMixin,
                      viewsets.GenericViewSet):
     pagination_class = None
+    async_read_actions = ('list', 'retrieve')
     permission_classes = (AllowAny,)
 
 
@@ -91,32 +125,53 @@ class TagViewSet(TagIngredients):
 class IngredientViewSet(TagIngredients):
     queryset = Ingredients.objects.all()
     serializer_class = IngredientSerializer
-    filter_backends = (filters.SearchFilter,)
-    search_fields = ('^name',)
+    filter_backends = (IngredientSearchFilter,)
 
+    def get_list_data(self):
+        term = self.request.query_params.get(api_settings.SEARCH_PARAM,
+                                             '').strip()
+        if settings.INGREDIENTS_PREFIX_INDEX and term:
+            results = ingredient_index.search(
+                term, IngredientSearchFilter.max_results)
+            # Fewer prefix matches are followed by substring matches
+            if len(results) == IngredientSearchFilter.max_results:
+                return results
+        return super().get_list_data()
 
-class RecipesViewSet(viewsets.ModelViewSet):
+
+class RecipesViewSet(AsyncReadMixin, viewsets.ModelViewSet):
     serializer_class = RecipesSerializer
     permission_classes = (RecipesPermission,)
     pagination_class = MyPagination
     queryset = Recipes.objects.all()
     filterset_class = CustomFilter
+    cursor_ordering = ('-pub_date', '-id')
+    async_read_actions = ('list', 'retrieve', 'by_ingredients',
+                          'similar', 'shopping_cart_summary')
+
+    def get_queryset(self):
+        return Recipes.objects.with_related(self.request.user)
+
+    def refresh_instance(self, serializer):
+        serializer.instance = self.get_queryset().get(
+            pk=serializer.instance.pk)
+
+    def perform_create(self, serializer):
+        serializer.save()
+        self.refresh_instance(serializer)
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.refresh_instance(serializer)
 
     def filter_queryset(self, queryset):
-        mapping_follow = {'is_favorited': 'recipe_favorite__user',
-                          'is_in_shopping_cart': 'recipe_shop__user'}
-        filter_list = []
-        for use_filter, use_attr in mapping_follow.items():
+        for use_filter in ('is_favorited', 'is_in_shopping_cart'):
             filter_query = self.request.query_params.get(use_filter)
-            if filter_query is not None and filter_query[0].isdigit():
-                filter_list.append([use_attr, int(filter_query[0])])
-        for filter_use in filter_list:
-            queryset = getattr(
-                queryset, 'filter' if filter_use[1]
-                else 'exclude')(
-                **{filter_use[0]: self.request.user})
+            if filter_query is not None and filter_query[:1].isdigit():
+                queryset = queryset.filter(
+                    **{use_filter: bool(int(filter_query[0]))})
         return DjangoFilterBackend().filter_queryset(self.request,
-                                                     queryset.distinct(),
+                                                     queryset,
                                                      view=self)
 
     def favorite_shopping_method(self, request, pk, use_serializer,
@@ -125,7 +180,9 @@ class RecipesViewSet(viewsets.ModelViewSet):
             recipe_use = getattr(self.get_object(), field).select_related(
                 'user').filter(user=request.user)
             if recipe_use:
-                recipe_use.delete()
+                # With the shopping cart totals
+                with transaction.atomic():
+                    recipe_use.delete()
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response({'error': error},
                             status=status.HTTP_400_BAD_REQUEST)
@@ -133,7 +190,8 @@ class RecipesViewSet(viewsets.ModelViewSet):
         serializer = use_serializer(data={'id': pk},
                                     context={'request': request})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
         return Response(serializer.data,
                         status=status.HTTP_201_CREATED)
 
@@ -156,6 +214,86 @@ class RecipesViewSet(viewsets.ModelViewSet):
             error='Рецепта нет в избранном')
 
     @action(detail=False, methods=['GET'],
-            permission_classes=[IsAuthenticated])
+            permission_classes=[IsAuthenticated],
+            content_negotiation_class=ExportContentNegotiation)
     def download_shopping_cart(self, request):
-        return get_shoping_cart(user=request.user)
+        export_format = request.query_params.get('format', 'csv')
+        encoding = request.query_params.get('encoding', 'cp1251')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'format':
+                    f'Допустимые значения: {", ".join(EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST)
+        if encoding not in EXPORT_ENCODINGS:
+            return Response(
+                {'encoding':
+                    f'Допустимые значения: {", ".join(EXPORT_ENCODINGS)}'},
+                status=status.HTTP_400_BAD_REQUEST)
+        return get_shoping_cart(
+            user=request.user, export_format=export_format,
+            encoding=encoding,
+            buffered=isinstance(request._request, ASGIRequest))
+
+    @action(detail=False, methods=['GET'],
+            permission_classes=[IsAuthenticated])
+    def shopping_cart_summary(self, request):
+        """Ingredients of the shopping cart summed over its recipes."""
+        totals = request.user.shopping_cart_totals.select_related(
+            'ingredient').order_by('ingredient__name', 'ingredient_id')
+        return Response({
+            'recipes': ShoppingCart.objects.filter(user=request.user).count(),
+            'ingredients': ShoppingCartTotalSerializer(totals,
+                                                       many=True).data})
+
+    @action(detail=False, methods=['GET'])
+    def by_ingredients(self, request):
+        """
+        Recipes ranked by the share of their ingredients the user has:
+        ?ingredients=1,2&ingredients=3, optionally ?max_missing=K.
+        """
+        ingredients = ','.join(
+            request.query_params.getlist('ingredients')).split(',')
+        max_missing = request.query_params.get('max_missing')
+        if not all(ingredient.isdigit() for ingredient in ingredients):
+            return Response({'ingredients': 'Укажите id ингредиентов.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if max_missing is not None and not max_missing.isdigit():
+            return Response({'max_missing': 'Ожидается целое число.'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        matches = recipe_index.match(
+            [int(ingredient) for ingredient in ingredients],
+            int(max_missing) if max_missing is not None else None)
+        page = self.paginate_queryset(matches)
+        return self.get_paginated_response(self.ranked_data(
+            page, lambda coverage, missing: {
+                'coverage': round(coverage, 3), 'missing': missing}))
+
+    @action(detail=True, methods=['GET'])
+    def similar(self, request, pk=None):
+        """
+        Recipes with similar ingredients and tags, precomputed by
+        build_similar; ?limit= caps the number.
+        """
+        recipe = get_object_or_404(Recipes.objects.only('pk'), pk=pk)
+        neighbours = similar_recipes.neighbours(recipe.pk)
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            if not limit.isdigit():
+                return Response({'limit': 'Ожидается целое число.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            neighbours = neighbours[:int(limit)]
+        return Response(self.ranked_data(
+            neighbours, lambda score: {'similarity': round(score, 3)}))
+
+    def ranked_data(self, rows, extra):
+        """
+        :param rows: [(recipe id, *values)] in the order of the response
+        :param extra: function of the values returning additional fields
+        :return: serialized recipes that still exist
+        """
+        recipes = self.get_queryset().in_bulk([row[0] for row in rows])
+        rows = [row for row in rows if row[0] in recipes]
+        serializer = self.get_serializer(
+            [recipes[row[0]] for row in rows], many=True)
+        return [dict(data, **extra(*row[1:]))
+                for data, row in zip(serializer.data, rows)]
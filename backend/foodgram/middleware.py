@@ -0,0 +1,109 @@
+import asyncio
+import hashlib
+import random
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.permissions import SAFE_METHODS
+
+from .postgresql import statement_timeout
+from .routers import read_database, replicas
+
+
+class StatementTimeoutMiddleware:
+    """
+    statement_timeout from settings.STATEMENT_TIMEOUTS for read (safe
+    methods) or write requests, applied by foodgram.postgresql.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets the handler await the middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    @staticmethod
+    def timeout(request):
+        return settings.STATEMENT_TIMEOUTS.get(
+            'read' if request.method in SAFE_METHODS else 'write')
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.acall(request)
+        token = statement_timeout.set(self.timeout(request))
+        try:
+            return self.get_response(request)
+        finally:
+            statement_timeout.reset(token)
+
+    async def acall(self, request):
+        token = statement_timeout.set(self.timeout(request))
+        try:
+            return await self.get_response(request)
+        finally:
+            statement_timeout.reset(token)
+
+
+class ReplicaMiddleware:
+    """
+    Picks a replica for the reads of safe-method requests
+    (foodgram.routers). After a successful write the client, identified
+    by its token or session, reads from default for
+    settings.DB_REPLICA_PIN_SECONDS to see its own changes.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.replicas = replicas()
+        if asyncio.iscoroutinefunction(get_response):
+            # Lets the handler await the middleware
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    @staticmethod
+    def pin_key(request):
+        client = (request.META.get('HTTP_AUTHORIZATION')
+                  or request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        if client:
+            return 'replica-pin:' + hashlib.md5(client.encode()).hexdigest()
+        return None
+
+    def choose(self, request):
+        """:return: replica alias or None for default"""
+        if not self.replicas or request.method not in SAFE_METHODS:
+            return None
+        key = self.pin_key(request)
+        if key is not None and cache.get(key):
+            return None
+        return random.choice(self.replicas)
+
+    def pin(self, request, response):
+        if (self.replicas and request.method not in SAFE_METHODS
+                and response.status_code < 400):
+            key = self.pin_key(request)
+            if key is not None:
+                cache.set(key, True, settings.DB_REPLICA_PIN_SECONDS)
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.acall(request)
+        token = read_database.set(self.choose(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            read_database.reset(token)
+        self.pin(request, response)
+        return response
+
+    async def acall(self, request):
+        token = read_database.set(await sync_to_async(self.choose)(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            read_database.reset(token)
+        await sync_to_async(self.pin)(request, response)
+        return response
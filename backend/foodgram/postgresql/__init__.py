@@ -0,0 +1,10 @@
+"""
+PostgreSQL backend with health checks of persistent connections and
+statement_timeout per request class, DB_ENGINE=foodgram.postgresql.
+"""
+import contextvars
+
+# Milliseconds for the queries of the current request, None - keep the
+# value the connection has. Set by foodgram.middleware.
+statement_timeout = contextvars.ContextVar('statement_timeout',
+                                           default=None)
@@ -0,0 +1,64 @@
+from django.db.backends.postgresql import base
+
+from . import statement_timeout
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    HEALTH_CHECKS in the database settings: a persistent connection is
+    checked with SELECT 1 before its first use in a request and replaced
+    if the server dropped it (built into Django since 4.1).
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_enabled = self.settings_dict.get('HEALTH_CHECKS',
+                                                           False)
+        self.health_check_done = False
+        # statement_timeout set on the connection, None - unknown
+        self.applied_timeout = None
+
+    def connect(self):
+        # Before connection_created receivers run their queries
+        self.health_check_done = True
+        self.applied_timeout = None
+        super().connect()
+
+    def close_if_unusable_or_obsolete(self):
+        self.health_check_done = False
+        super().close_if_unusable_or_obsolete()
+
+    def close_if_health_check_failed(self):
+        if (self.health_check_enabled and not self.health_check_done
+                and self.connection is not None
+                and not self.in_atomic_block):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+
+    def _cursor(self, name=None):
+        # Not in ensure_connection, which get_autocommit calls at the
+        # request start
+        self.close_if_health_check_failed()
+        cursor = super()._cursor(name)
+        timeout = statement_timeout.get()
+        if timeout is not None and timeout != self.applied_timeout:
+            with self.wrap_database_errors:
+                with self.connection.cursor() as raw_cursor:
+                    raw_cursor.execute('SET statement_timeout = %s',
+                                       [timeout])
+            self.applied_timeout = timeout
+        return cursor
+
+    def _rollback(self):
+        # SET inside the transaction is rolled back too
+        try:
+            return super()._rollback()
+        finally:
+            self.applied_timeout = None
+
+    def _savepoint_rollback(self, sid):
+        # After the rollback: it runs on a cursor, which would SET first
+        try:
+            return super()._savepoint_rollback(sid)
+        finally:
+            self.applied_timeout = None
@@ -0,0 +1,72 @@
+import contextvars
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+# Replica alias for the reads of the current request, None - default.
+# Set by foodgram.middleware.ReplicaMiddleware; ReplicaRouter replaces it
+# with the result of the connection check, which the middleware resets
+# with the request.
+read_database = contextvars.ContextVar('read_database', default=None)
+# alias: time.monotonic() until which the replica is skipped
+unavailable = {}
+unavailable_lock = threading.Lock()
+
+
+class Connected(str):
+    """Replica alias whose connection was checked in this request."""
+
+
+def replicas():
+    return [alias for alias in settings.DATABASES if alias != 'default']
+
+
+class ReplicaRouter:
+    """
+    Reads go to the replica chosen for the request, or to default when
+    none is chosen or the replica does not connect. Writes and
+    migrations go to default, replicas get the data by replication.
+    Tokens and sessions are always read from default: a client that
+    has just logged in must find its token.
+    """
+    primary_apps = ('authtoken', 'sessions')
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in self.primary_apps:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        alias = read_database.get()
+        if alias is None or isinstance(alias, Connected):
+            return alias
+        with unavailable_lock:
+            skipped = unavailable.get(alias, 0) > time.monotonic()
+        if not skipped:
+            try:
+                connections[alias].ensure_connection()
+            except DatabaseError:
+                logger.warning('Replica %s is unavailable, reading from '
+                               'default', alias, exc_info=True)
+                with unavailable_lock:
+                    unavailable[alias] = (time.monotonic()
+                                          + settings.DB_REPLICA_RETRY_SECONDS)
+                skipped = True
+        # Checked once per request (and per thread of an async view,
+        # each with its own connection)
+        read_database.set(None if skipped else Connected(alias))
+        return None if skipped else alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
@@ -7,7 +7,7 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 SECRET_KEY = os.getenv('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+DEBUG = os.getenv('DEBUG', default='True') == 'True'
 
 ALLOWED_HOSTS = ['localhost', '*', '51.250.22.7']
 
@@ -19,6 +19,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'djoser',
@@ -27,6 +28,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.RequestMetricsMiddleware',
+    'foodgram.middleware.StatementTimeoutMiddleware',
+    'foodgram.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -59,19 +63,70 @@ WSGI_APPLICATION = 'foodgram.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# DB_HOST and DB_PORT point to PgBouncer (transaction pooling)
+DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', default='False') == 'True'
+
 DATABASES = {
     # 'default': {
     #     'ENGINE': 'django.db.backends.sqlite3',
     #     'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     # }
     'default': {
-        'ENGINE': os.getenv('DB_ENGINE',
-                            default='django.db.backends.postgresql'),
+        'ENGINE': os.getenv('DB_ENGINE', default='foodgram.postgresql'),
         'NAME': os.getenv('DB_NAME', default='postgres'),
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
         'PORT': os.getenv('DB_PORT', default='5432'),
+        # Seconds to keep a connection between requests, 0 - per request
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default='60')),
+        # foodgram.postgresql: check kept connections before reuse
+        'HEALTH_CHECKS': os.getenv('DB_HEALTH_CHECKS',
+                                   default='True') == 'True',
+        # PgBouncer in transaction mode has no server-side cursors
+        'DISABLE_SERVER_SIDE_CURSORS': DB_PGBOUNCER,
+    }
+}
+
+# Read replicas, comma separated host[:port][/name]. Reads of GET
+# requests go to them (foodgram.routers), a client that has just written
+# reads from default for DB_REPLICA_PIN_SECONDS. The pin is kept in the
+# cache, so with several workers CACHE_BACKEND should be shared.
+DB_REPLICAS = [replica for replica in os.getenv('DB_REPLICAS',
+                                                default='').split(',')
+               if replica]
+for number, replica in enumerate(DB_REPLICAS, 1):
+    address, _, name = replica.partition('/')
+    host, _, port = address.partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'NAME': name or DATABASES['default']['NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['foodgram.routers.ReplicaRouter']
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS',
+                                       default='5'))
+# A replica that failed to connect is skipped for this long
+DB_REPLICA_RETRY_SECONDS = int(os.getenv('DB_REPLICA_RETRY_SECONDS',
+                                         default='30'))
+
+# statement_timeout, ms, for read (GET, HEAD, OPTIONS) and write requests,
+# foodgram.postgresql and foodgram.middleware. A session SET leaks to
+# other clients behind PgBouncer in transaction mode, set the timeout
+# for the database role there instead.
+STATEMENT_TIMEOUTS = {} if DB_PGBOUNCER else {
+    'read': int(os.getenv('DB_READ_TIMEOUT', default='5000')),
+    'write': int(os.getenv('DB_WRITE_TIMEOUT', default='15000')),
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default=''),
     }
 }
 
@@ -132,3 +187,49 @@ DJOSER = {
 }
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Requests with more SQL queries are logged by api.metrics
+REQUEST_QUERY_BUDGET = int(os.getenv('REQUEST_QUERY_BUDGET', default='30'))
+# /api/metrics/ is served to staff users and to requests with
+# "Authorization: Bearer <METRICS_TOKEN>" (Prometheus bearer_token)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
+# Uploaded recipe images and thumbnails (recipes.images): WEBP or JPEG
+RECIPE_IMAGE_FORMAT = os.getenv('RECIPE_IMAGE_FORMAT', default='WEBP')
+RECIPE_IMAGE_QUALITY = int(os.getenv('RECIPE_IMAGE_QUALITY', default='82'))
+RECIPE_IMAGE_MAX_BYTES = int(os.getenv('RECIPE_IMAGE_MAX_BYTES',
+                                       default=str(20 * 2 ** 20)))
+RECIPE_IMAGE_MAX_PIXELS = int(os.getenv('RECIPE_IMAGE_MAX_PIXELS',
+                                        default='40000000'))
+# Threads re-encoding images after the response; 0 - in the request
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', default='0'))
+# Base64 images come in the JSON body
+DATA_UPLOAD_MAX_MEMORY_SIZE = RECIPE_IMAGE_MAX_BYTES * 4 // 3 + 2 ** 20
+
+# Serve ingredient prefix search from an in-memory index (api.autocomplete)
+INGREDIENTS_PREFIX_INDEX = os.getenv('INGREDIENTS_PREFIX_INDEX',
+                                     default='False') == 'True'
+
+# wsgi - sync gunicorn workers, asgi - uvicorn workers (gunicorn.conf.py)
+SERVER_APP = os.getenv('SERVER_APP', default='wsgi')
+# Under ASGI GET requests of the hot endpoints run in a thread pool
+# (api.async_views). Each pool thread holds its own database connection,
+# so a worker uses up to ASYNC_READ_THREADS + 1 connections.
+ASYNC_READS = SERVER_APP == 'asgi'
+ASYNC_READ_THREADS = int(os.getenv('ASYNC_READ_THREADS', default='16'))
+
+# Text search configuration of the recipe search (recipes.search)
+RECIPE_SEARCH_CONFIG = os.getenv('RECIPE_SEARCH_CONFIG', default='russian')
+
+# Precomputed similar recipes (recipes.similar, manage.py build_similar)
+SIMILAR_RECIPES_FILE = os.getenv(
+    'SIMILAR_RECIPES_FILE',
+    default=os.path.join(BASE_DIR, 'similar', 'recipes.bin'))
+SIMILAR_RECIPES_TOP = int(os.getenv('SIMILAR_RECIPES_TOP', default='20'))
+
+# Subscription feed (recipes.feed): new recipes are copied into the feeds
+# of followers unless the author has more followers than this; entries
+# kept per user
+FEED_FANOUT_MAX_FOLLOWERS = int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS',
+                                          default='5000'))
+FEED_MAX_ENTRIES = int(os.getenv('FEED_MAX_ENTRIES', default='1000'))
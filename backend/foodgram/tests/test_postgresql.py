@@ -0,0 +1,171 @@
+from unittest import mock
+
+import psycopg2
+from asgiref.sync import async_to_sync
+from django.db import connections, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from foodgram.middleware import StatementTimeoutMiddleware
+from foodgram.postgresql import statement_timeout
+from foodgram.postgresql.base import DatabaseWrapper
+
+
+class MockedConnectionTest(SimpleTestCase):
+    """foodgram.postgresql on psycopg2 connections replaced by mocks."""
+    def setUp(self):
+        self.executed = []
+        self.connections = []
+        self.database = DatabaseWrapper({
+            **connections['default'].settings_dict,
+            'ENGINE': 'foodgram.postgresql', 'NAME': 'foodgram',
+            'CONN_MAX_AGE': 60, 'HEALTH_CHECKS': True}, 'mocked')
+        # connection_created receivers of django.contrib.postgres look
+        # the connection up by alias
+        connections['mocked'] = self.database
+        self.addCleanup(delattr, connections._connections, 'mocked')
+        patcher = mock.patch.object(DatabaseWrapper, 'get_new_connection',
+                                    side_effect=self.new_connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        token = statement_timeout.set(5000)
+        self.addCleanup(statement_timeout.reset, token)
+
+    def new_connection(self, params):
+        connection = mock.MagicMock()
+        cursor = connection.cursor.return_value
+        cursor.__enter__.return_value = cursor
+        cursor.execute.side_effect = (
+            lambda sql, params=None: self.executed.append((sql, params)))
+        self.connections.append(connection)
+        return connection
+
+    def query(self):
+        with self.database.cursor() as cursor:
+            cursor.execute('SELECT 2')
+
+    def statements(self, prefix):
+        return [params for sql, params in self.executed
+                if sql.startswith(prefix)]
+
+    def test_timeout_set_once(self):
+        self.query()
+        self.query()
+        self.assertEqual(self.statements('SET statement_timeout'), [[5000]])
+        token = statement_timeout.set(15000)
+        try:
+            self.query()
+        finally:
+            statement_timeout.reset(token)
+        self.query()
+        self.assertEqual(self.statements('SET statement_timeout'),
+                         [[5000], [15000], [5000]])
+
+    def test_no_timeout(self):
+        token = statement_timeout.set(None)
+        try:
+            self.query()
+        finally:
+            statement_timeout.reset(token)
+        self.assertEqual(self.statements('SET statement_timeout'), [])
+
+    def test_set_again_after_rollback(self):
+        self.query()
+        self.database.rollback()
+        self.query()
+        self.assertEqual(self.statements('SET statement_timeout'),
+                         [[5000], [5000]])
+
+    def test_set_again_after_savepoint_rollback(self):
+        with transaction.atomic(using='mocked'):
+            savepoint = self.database.savepoint()
+            # SET inside the savepoint
+            self.query()
+            self.database.savepoint_rollback(savepoint)
+            rollback = len(self.executed)
+            self.query()
+        self.assertEqual(self.executed[rollback - 1][0],
+                         f'ROLLBACK TO SAVEPOINT "{savepoint}"')
+        self.assertEqual(self.statements('SET statement_timeout'),
+                         [[5000], [5000]])
+        self.assertEqual(self.executed[rollback][0],
+                         'SET statement_timeout = %s')
+
+    def test_set_again_after_reconnect(self):
+        self.query()
+        self.database.close()
+        self.query()
+        self.assertEqual(len(self.connections), 2)
+        self.assertEqual(self.statements('SET statement_timeout'),
+                         [[5000], [5000]])
+
+    def test_health_check_once_per_request(self):
+        self.query()
+        self.assertEqual(self.statements('SELECT 1'), [])
+        for _ in range(2):
+            # request_started
+            self.database.close_if_unusable_or_obsolete()
+            self.assertEqual(len(self.statements('SELECT 1')), _)
+            self.query()
+            self.query()
+            self.assertEqual(len(self.statements('SELECT 1')), _ + 1)
+        self.assertEqual(len(self.connections), 1)
+
+    def test_dropped_connection_replaced(self):
+        self.query()
+        self.database.close_if_unusable_or_obsolete()
+        self.connections[0].cursor.return_value.execute.side_effect = (
+            psycopg2.OperationalError('server closed the connection'))
+        self.query()
+        self.assertEqual(len(self.connections), 2)
+        self.connections[0].close.assert_called_once_with()
+
+    def test_health_checks_disabled(self):
+        self.database.health_check_enabled = False
+        self.query()
+        self.database.close_if_unusable_or_obsolete()
+        self.query()
+        self.assertEqual(self.statements('SELECT 1'), [])
+
+
+@override_settings(STATEMENT_TIMEOUTS={'read': 5000, 'write': 15000})
+class StatementTimeoutMiddlewareTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def view(self, request):
+        self.timeout = statement_timeout.get()
+        return HttpResponse()
+
+    def test_read_and_write(self):
+        middleware = StatementTimeoutMiddleware(self.view)
+        for method, timeout in (('get', 5000), ('head', 5000),
+                                ('options', 5000), ('post', 15000),
+                                ('patch', 15000), ('delete', 15000)):
+            middleware(getattr(self.factory, method)('/api/recipes/'))
+            self.assertEqual(self.timeout, timeout, method)
+            self.assertIsNone(statement_timeout.get())
+
+    @override_settings(STATEMENT_TIMEOUTS={})
+    def test_pgbouncer(self):
+        StatementTimeoutMiddleware(self.view)(self.factory.get('/'))
+        self.assertIsNone(self.timeout)
+
+    def test_reset_on_error(self):
+        def view(request):
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            StatementTimeoutMiddleware(view)(self.factory.post('/'))
+        self.assertIsNone(statement_timeout.get())
+
+    def test_async(self):
+        async def view(request):
+            return self.view(request)
+
+        middleware = StatementTimeoutMiddleware(view)
+        async_to_sync(middleware)(self.factory.post('/api/recipes/'))
+        self.assertEqual(self.timeout, 15000)
+        async_to_sync(middleware)(self.factory.get('/api/recipes/'))
+        self.assertEqual(self.timeout, 5000)
+        self.assertIsNone(statement_timeout.get())
@@ -0,0 +1,153 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.db import connections, router
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+from rest_framework.authtoken.models import Token
+
+from foodgram import routers
+from foodgram.middleware import ReplicaMiddleware
+from recipes.models import Recipes
+
+REPLICA = 'replica'
+
+
+class ReplicaTestCase(TestCase):
+    """A second SQLite alias, as settings adds for DB_REPLICAS."""
+    replica_name = 'replica.sqlite3'
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        # connections.databases is settings.DATABASES, seen by replicas()
+        connections.databases[REPLICA] = {
+            **connections['default'].settings_dict,
+            'NAME': os.path.join(directory, self.replica_name),
+        }
+        self.addCleanup(self.remove_replica)
+        routers.unavailable.clear()
+        cache.clear()
+
+    @staticmethod
+    def remove_replica():
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        routers.unavailable.clear()
+
+
+class ReplicaRouterTest(ReplicaTestCase):
+    def read_database(self, model, alias):
+        token = routers.read_database.set(alias)
+        try:
+            return model.objects.all().db
+        finally:
+            routers.read_database.reset(token)
+
+    def test_chosen_replica(self):
+        self.assertEqual(self.read_database(Recipes, REPLICA), REPLICA)
+        self.assertIsNotNone(connections[REPLICA].connection)
+        self.assertEqual(self.read_database(Recipes, None), 'default')
+
+    def test_checked_once_per_request(self):
+        with mock.patch.object(connections[REPLICA],
+                               'ensure_connection') as ensure_connection:
+            for _ in range(2):
+                token = routers.read_database.set(REPLICA)
+                try:
+                    self.assertEqual(Recipes.objects.all().db, REPLICA)
+                    self.assertEqual(Recipes.objects.all().db, REPLICA)
+                finally:
+                    routers.read_database.reset(token)
+                self.assertEqual(routers.read_database.get(), None)
+        self.assertEqual(ensure_connection.call_count, 2)
+
+    def test_primary_apps(self):
+        for model in (Token, Session):
+            self.assertEqual(self.read_database(model, REPLICA), 'default')
+
+    def test_writes(self):
+        token = routers.read_database.set(REPLICA)
+        try:
+            self.assertEqual(router.db_for_write(Recipes), 'default')
+        finally:
+            routers.read_database.reset(token)
+
+
+class UnavailableReplicaTest(ReplicaTestCase):
+    replica_name = os.path.join('missing', 'replica.sqlite3')
+
+    def test_fallback(self):
+        token = routers.read_database.set(REPLICA)
+        try:
+            with self.assertLogs('foodgram.routers', 'WARNING') as logs:
+                self.assertEqual(Recipes.objects.all().db, 'default')
+                # Skipped without connecting until the retry time
+                self.assertEqual(Recipes.objects.all().db, 'default')
+        finally:
+            routers.read_database.reset(token)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn(REPLICA, routers.unavailable)
+        # The next request skips it without connecting
+        token = routers.read_database.set(REPLICA)
+        try:
+            with mock.patch.object(connections[REPLICA],
+                                   'ensure_connection') as ensure_connection:
+                self.assertEqual(Recipes.objects.all().db, 'default')
+        finally:
+            routers.read_database.reset(token)
+        ensure_connection.assert_not_called()
+
+
+class ReplicaMiddlewareTest(ReplicaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.factory = RequestFactory()
+        self.status = 200
+        self.middleware = ReplicaMiddleware(self.view)
+
+    def view(self, request):
+        self.chosen = routers.read_database.get()
+        return HttpResponse(status=self.status)
+
+    def request(self, method, authorization='Token a', status=200):
+        self.status = status
+        self.middleware(getattr(self.factory, method)(
+            '/api/recipes/', HTTP_AUTHORIZATION=authorization))
+        return self.chosen
+
+    def test_reads_from_replica(self):
+        self.assertEqual(self.request('get'), REPLICA)
+        self.assertIsNone(routers.read_database.get())
+
+    def test_pinned_after_write(self):
+        self.assertIsNone(self.request('post', status=201))
+        self.assertIsNone(self.request('get'))
+        self.assertEqual(self.request('get', 'Token b'), REPLICA)
+        cache.clear()
+        self.assertEqual(self.request('get'), REPLICA)
+
+    def test_not_pinned_after_error(self):
+        self.request('post', status=400)
+        self.assertEqual(self.request('get'), REPLICA)
+
+    def test_async(self):
+        async def view(request):
+            return self.view(request)
+
+        middleware = ReplicaMiddleware(view)
+        request = self.factory.post('/api/recipes/',
+                                    HTTP_AUTHORIZATION='Token a')
+        async_to_sync(middleware)(request)
+        self.assertIsNone(self.chosen)
+        async_to_sync(middleware)(self.factory.get(
+            '/api/recipes/', HTTP_AUTHORIZATION='Token a'))
+        self.assertIsNone(self.chosen)
+        async_to_sync(middleware)(self.factory.get('/api/recipes/'))
+        self.assertEqual(self.chosen, REPLICA)
@@ -0,0 +1,6 @@
+import os
+
+bind = '0:8000'
+workers = int(os.getenv('GUNICORN_WORKERS', default='1'))
+if os.getenv('SERVER_APP', default='wsgi') == 'asgi':
+    worker_class = 'uvicorn.workers.UvicornWorker'
@@ -1,6 +1,9 @@
 from django.contrib import admin
 
-from .models import Favorites, IngredientCount, Ingredients, Recipes, Tags
+from .cart import recipe_amounts, recipe_ingredients_replaced
+from .models import IngredientCount, Ingredients, Recipes, Tags
+from .search import schedule_update
+from .signals import recipe_ingredients_changed
 
 
 @admin.register(Tags)
@@ -31,6 +34,14 @@ class RecipesAdmin(admin.ModelAdmin):
     inlines = (IngredientsInLine,)
 
     def favorites(self, rec):
-        return Favorites.objects.filter(recipe=rec.id).count()
+        return rec.favorites_count
 
     favorites.short_description = 'В избранном'
+    favorites.admin_order_field = 'favorites_count'
+
+    def save_related(self, request, form, formsets, change):
+        old_amounts = recipe_amounts(form.instance.pk) if change else {}
+        super().save_related(request, form, formsets, change)
+        schedule_update(Recipes.objects.filter(pk=form.instance.pk))
+        recipe_ingredients_changed(form.instance.pk)
+        recipe_ingredients_replaced(form.instance.pk, old_amounts)
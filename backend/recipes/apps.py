@@ -1,6 +1,36 @@
 from django.apps import AppConfig
+from django.db.models.signals import (post_delete, post_migrate, post_save,
+                                      pre_delete)
 
 
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from .models import (Favorites, Follow, Ingredients, Recipes,
+                             ShoppingCart, Tags)
+        from .signals import (cart_recipe_added, cart_recipe_removed,
+                              create_search_indexes, follow_created,
+                              follow_deleted, ingredient_renamed,
+                              invalidate_reference, recipe_created,
+                              recipe_deleted, recipe_ingredients_deleted,
+                              recipe_marked, recipe_search_deleted,
+                              recipe_unmarked)
+
+        post_migrate.connect(create_search_indexes, sender=self)
+        for model in (Ingredients, Tags):
+            post_save.connect(invalidate_reference, sender=model)
+            post_delete.connect(invalidate_reference, sender=model)
+        for model in (Favorites, ShoppingCart):
+            post_save.connect(recipe_marked, sender=model)
+            post_delete.connect(recipe_unmarked, sender=model)
+        post_save.connect(cart_recipe_added, sender=ShoppingCart)
+        pre_delete.connect(cart_recipe_removed, sender=ShoppingCart)
+        post_save.connect(recipe_created, sender=Recipes)
+        post_delete.connect(recipe_deleted, sender=Recipes)
+        post_save.connect(ingredient_renamed, sender=Ingredients)
+        post_delete.connect(recipe_search_deleted, sender=Recipes)
+        post_delete.connect(recipe_ingredients_deleted, sender=Recipes)
+        post_save.connect(follow_created, sender=Follow)
+        post_delete.connect(follow_deleted, sender=Follow)
@@ -0,0 +1,67 @@
+from collections import defaultdict
+
+from django.db.models import Case, F, FloatField, IntegerField, Value, When
+
+from .models import IngredientCount, ShoppingCart, ShoppingCartTotal
+
+BATCH_SIZE = 1000
+
+
+def recipe_amounts(recipe_id):
+    """:return: {ingredient id: amount} of the recipe"""
+    amounts = defaultdict(float)
+    for ingredient, count in IngredientCount.objects.filter(
+            recipe_id=recipe_id).values_list('ingredient', 'count'):
+        amounts[ingredient] += count
+    return amounts
+
+
+def change_totals(users, changes):
+    """
+    :param users: user ids, a list or a values_list queryset
+    :param changes: {ingredient id: (amount delta, recipes delta)}
+    """
+    if not changes:
+        return
+    ShoppingCartTotal.objects.bulk_create(
+        [ShoppingCartTotal(user_id=user, ingredient_id=ingredient)
+         for user in users
+         for ingredient, (_, recipes) in changes.items() if recipes > 0],
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    rows = ShoppingCartTotal.objects.filter(user__in=users,
+                                            ingredient__in=changes)
+    rows.update(
+        total=F('total') + Case(
+            *(When(ingredient_id=ingredient, then=Value(amount))
+              for ingredient, (amount, _) in changes.items()),
+            default=Value(0.0), output_field=FloatField()),
+        recipes=F('recipes') + Case(
+            *(When(ingredient_id=ingredient, then=Value(recipes))
+              for ingredient, (_, recipes) in changes.items()),
+            default=Value(0), output_field=IntegerField()))
+    if any(recipes < 0 for _, recipes in changes.values()):
+        rows.filter(recipes__lte=0).delete()
+
+
+def change_cart(user_id, recipe_id, sign):
+    """Add (sign 1) or remove (sign -1) the recipe from the totals."""
+    change_totals([user_id], {
+        ingredient: (sign * amount, sign)
+        for ingredient, amount in recipe_amounts(recipe_id).items()})
+
+
+def recipe_ingredients_replaced(recipe_id, old):
+    """
+    Move the totals of the carts with the recipe to its new ingredients.
+    Called explicitly: ingredients are saved with bulk_create.
+    :param old: recipe_amounts before the change
+    """
+    new = recipe_amounts(recipe_id)
+    changes = {}
+    for ingredient in set(old) | set(new):
+        amount = new.get(ingredient, 0) - old.get(ingredient, 0)
+        recipes = (ingredient in new) - (ingredient in old)
+        if amount or recipes:
+            changes[ingredient] = (amount, recipes)
+    change_totals(ShoppingCart.objects.filter(recipe_id=recipe_id)
+                  .values_list('user', flat=True), changes)
@@ -0,0 +1,140 @@
+from itertools import chain
+
+from django.conf import settings
+from django.db.models import Q
+
+from .models import AuthorStats, FeedEntry, Follow, Recipes
+
+BATCH_SIZE = 1000
+
+
+def is_popular(author_id):
+    """
+    Recipes of authors with more than FEED_FANOUT_MAX_FOLLOWERS followers
+    are not copied into feeds but read at request time.
+    """
+    return AuthorStats.objects.filter(
+        author_id=author_id,
+        followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS).exists()
+
+
+def entries(user_id, recipes):
+    """:param recipes: [(recipe id, author id, pub_date)]"""
+    return [FeedEntry(user_id=user_id, recipe_id=recipe, author_id=author,
+                      pub_date=pub_date)
+            for recipe, author, pub_date in recipes]
+
+
+def fan_out(recipe):
+    """Copy a new recipe into the feeds of the author's followers."""
+    if recipe.author_id is None or is_popular(recipe.author_id):
+        return
+    followers = Follow.objects.filter(author_id=recipe.author_id).values_list(
+        'user', flat=True)
+    FeedEntry.objects.bulk_create(
+        [FeedEntry(user_id=user, recipe=recipe, author_id=recipe.author_id,
+                   pub_date=recipe.pub_date) for user in followers],
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def backfill(user_id, author_id):
+    """Copy the latest recipes of a new subscription into the feed."""
+    if is_popular(author_id):
+        return
+    FeedEntry.objects.bulk_create(
+        entries(user_id, Recipes.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id').values_list('pk', 'author', 'pub_date')[
+            :settings.FEED_MAX_ENTRIES]),
+        batch_size=BATCH_SIZE, ignore_conflicts=True)
+    trim(user_id)
+
+
+def followers_changed(author_id, delta):
+    """
+    Move the author's recipes between the feed table and request time
+    reads when the followers counter, just changed by delta, crosses
+    FEED_FANOUT_MAX_FOLLOWERS: recipes posted and follows made while
+    the author was popular were not copied.
+    """
+    count = AuthorStats.objects.filter(author_id=author_id).values_list(
+        'followers_count', flat=True).first()
+    limit = settings.FEED_FANOUT_MAX_FOLLOWERS
+    if delta > 0 and count == limit + 1:
+        FeedEntry.objects.filter(author_id=author_id).delete()
+    elif delta < 0 and count == limit:
+        recipes = list(Recipes.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id').values_list('pk', 'author', 'pub_date')[
+            :settings.FEED_MAX_ENTRIES])
+        users = list(Follow.objects.filter(author_id=author_id).values_list(
+            'user', flat=True))
+        FeedEntry.objects.bulk_create(
+            chain.from_iterable(entries(user, recipes) for user in users),
+            batch_size=BATCH_SIZE, ignore_conflicts=True)
+        for user in users:
+            trim(user)
+
+
+def unfollow(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def trim(user_id):
+    """
+    Keep the latest FEED_MAX_ENTRIES entries of the feed.
+    :return: number of deleted entries
+    """
+    boundary = FeedEntry.objects.filter(user_id=user_id).order_by(
+        '-pub_date', '-recipe_id').values_list('pub_date', 'recipe_id')[
+        settings.FEED_MAX_ENTRIES:settings.FEED_MAX_ENTRIES + 1]
+    if not boundary:
+        return 0
+    pub_date, recipe = boundary[0]
+    return FeedEntry.objects.filter(
+        Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, recipe_id__lte=recipe),
+        user_id=user_id).delete()[0]
+
+
+def rebuild(user_id):
+    """Feed of the user from scratch, e.g. after bulk loads."""
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    authors = Follow.objects.filter(user_id=user_id).exclude(
+        author__stats__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values('author')
+    FeedEntry.objects.bulk_create(
+        entries(user_id, Recipes.objects.filter(author__in=authors).order_by(
+            '-pub_date', '-id').values_list('pk', 'author', 'pub_date')[
+            :settings.FEED_MAX_ENTRIES]),
+        batch_size=BATCH_SIZE)
+
+
+def feed_page(queryset, user, position, count):
+    """
+    Latest entries of the feed table merged with the latest recipes of
+    followed popular authors, each read by its own index.
+    :param queryset: Recipes queryset
+    :param position: [pub_date, id] of the last recipe seen or None
+    :param count: number of recipes
+    :return: recipes, newest first
+    """
+    parts = [FeedEntry.objects.filter(user=user).order_by(
+        '-pub_date', '-recipe_id').values_list('pub_date', 'recipe_id')]
+    popular = list(Follow.objects.filter(
+        user=user,
+        author__stats__followers_count__gt=settings.FEED_FANOUT_MAX_FOLLOWERS
+    ).values_list('author', flat=True))
+    if popular:
+        parts.append(Recipes.objects.filter(author__in=popular).order_by(
+            '-pub_date', '-id').values_list('pub_date', 'id'))
+    if position:
+        pub_date, recipe = position
+        parts[0] = parts[0].filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date,
+                                         recipe_id__lt=recipe))
+        parts[1:] = [part.filter(Q(pub_date__lt=pub_date)
+                                 | Q(pub_date=pub_date, id__lt=recipe))
+                     for part in parts[1:]]
+    ids = [recipe for _, recipe in sorted(
+        set(chain.from_iterable(part[:count] for part in parts)),
+        reverse=True)[:count]]
+    recipes = queryset.in_bulk(ids)
+    return [recipes[recipe] for recipe in ids if recipe in recipes]
@@ -0,0 +1,247 @@
+import base64
+import io
+import logging
+import os
+import re
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import connections
+from PIL import Image, ImageOps
+
+from .models import Recipes
+
+logger = logging.getLogger(__name__)
+
+IMAGE_MAX_SIZE = 1600
+THUMBNAIL_SIZES = {
+    'list': 320,
+    'card': 640,
+}
+EXTENSIONS = {
+    'WEBP': 'webp',
+    'JPEG': 'jpg',
+}
+EXIF_ORIENTATION = 0x0112
+# Base64 characters decoded at once
+DECODE_CHUNK_SIZE = 64 * 1024
+NOT_BASE64 = re.compile(r'[^A-Za-z0-9+/=]')
+
+executor = None
+executor_lock = threading.Lock()
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+def decode_base64(data):
+    """
+    Decode a data:image/...;base64 string into a temporary file chunk by
+    chunk. Byte size is checked before decoding and dimensions from the
+    image header, before Pillow decodes any pixels.
+    :param data: data URI
+    :return: TemporaryUploadedFile
+    """
+    header, _, encoded = data.partition(';base64,')
+    if not encoded:
+        raise ValueError('Not a base64 data URI')
+    if len(encoded) * 3 // 4 > settings.RECIPE_IMAGE_MAX_BYTES:
+        raise ImageTooLarge(
+            f'Размер изображения больше '
+            f'{settings.RECIPE_IMAGE_MAX_BYTES / 2 ** 20:g} МБ.')
+    content_type = header[len('data:'):]
+    upload = TemporaryUploadedFile(
+        name=f'{uuid.uuid4()}.{content_type.split("/")[-1]}',
+        content_type=content_type, size=0, charset=None)
+    try:
+        for chunk in decoded_chunks(encoded):
+            upload.write(chunk)
+        upload.size = upload.tell()
+        upload.seek(0)
+        with Image.open(upload) as image:
+            width, height = image.size
+        if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+            raise ImageTooLarge(
+                f'Изображение больше {settings.RECIPE_IMAGE_MAX_PIXELS} '
+                f'пикселей.')
+    except BaseException:
+        upload.close()
+        raise
+    upload.seek(0)
+    return upload
+
+
+def decoded_chunks(encoded):
+    """
+    Decode base64 by DECODE_CHUNK_SIZE characters. Like b64decode,
+    characters outside the alphabet (line breaks of wrapped base64) are
+    dropped; the rest short of a multiple of 4 goes to the next chunk.
+    """
+    rest = ''
+    for start in range(0, len(encoded), DECODE_CHUNK_SIZE):
+        chunk = rest + NOT_BASE64.sub(
+            '', encoded[start:start + DECODE_CHUNK_SIZE])
+        end = len(chunk) - len(chunk) % 4
+        yield base64.b64decode(chunk[:end])
+        rest = chunk[end:]
+    if rest:
+        # Incomplete last group, b64decode raises as for the whole string
+        yield base64.b64decode(rest)
+
+
+def shrink(image, max_size):
+    """
+    Fit the image into max_size in place, applying EXIF orientation.
+    :return: PIL image
+    """
+    if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    return image
+
+
+def encode(image):
+    """
+    :param image: PIL image
+    :return: bytes in settings.RECIPE_IMAGE_FORMAT
+    """
+    has_alpha = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+    mode = ('RGBA' if has_alpha and settings.RECIPE_IMAGE_FORMAT == 'WEBP'
+            else 'RGB')
+    if image.mode != mode:
+        image = image.convert(mode)
+    buffer = io.BytesIO()
+    image.save(buffer, settings.RECIPE_IMAGE_FORMAT,
+               quality=settings.RECIPE_IMAGE_QUALITY)
+    return buffer.getvalue()
+
+
+def converted_name(name, suffix=''):
+    """recipe/abc.png -> recipe/abc{suffix}.webp"""
+    return (f'{os.path.splitext(name)[0]}{suffix}.'
+            f'{EXTENSIONS[settings.RECIPE_IMAGE_FORMAT]}')
+
+
+def thumbnail_name(name, size):
+    """recipe/abc.png -> recipe/abc_list.webp"""
+    return converted_name(name, f'_{size}')
+
+
+def thumbnail_urls(image):
+    """
+    :param image: FieldFile of Recipes.image
+    :return: {size: url}, the image itself for thumbnails not written
+        yet (legacy images, pending or failed processing)
+    """
+    thumbnails = getattr(image.instance, 'thumbnails', None) or {}
+    base = os.path.splitext(image.name)[0]
+    urls = {}
+    for size in THUMBNAIL_SIZES:
+        name = thumbnails.get(size)
+        # Thumbnails of a replaced image are not used
+        if not name or os.path.splitext(name)[0] != f'{base}_{size}':
+            name = image.name
+        urls[size] = default_storage.url(name)
+    return urls
+
+
+def replace(name, content):
+    if default_storage.exists(name):
+        default_storage.delete(name)
+    return default_storage.save(name, ContentFile(content))
+
+
+def open_image(name):
+    with default_storage.open(name) as original:
+        image = Image.open(original)
+        image.draft('RGB', (IMAGE_MAX_SIZE, IMAGE_MAX_SIZE))
+        image.load()
+    return image
+
+
+def save_thumbnails(name, image, sizes):
+    """
+    Largest size first, each made from the previous one.
+    :return: {size: thumbnail name}
+    """
+    written = {}
+    for size in sorted(sizes, key=THUMBNAIL_SIZES.get, reverse=True):
+        image = shrink(image, THUMBNAIL_SIZES[size])
+        written[size] = replace(thumbnail_name(name, size), encode(image))
+    return written
+
+
+def make_thumbnails(name, force=True):
+    """
+    Save THUMBNAIL_SIZES versions of the stored image next to it.
+    :param name: image name in default_storage
+    :param force: rewrite existing thumbnails
+    :return: (number of thumbnails written, {size: thumbnail name} of
+        all sizes)
+    """
+    thumbnails = {size: thumbnail_name(name, size)
+                  for size in THUMBNAIL_SIZES}
+    sizes = [size for size, thumbnail in thumbnails.items()
+             if force or not default_storage.exists(thumbnail)]
+    if sizes:
+        thumbnails.update(save_thumbnails(name, open_image(name), sizes))
+    return len(sizes), thumbnails
+
+
+def process_recipe_image(recipe_id, name):
+    """
+    Re-encode an uploaded original to IMAGE_MAX_SIZE, point the recipe
+    to it and write the thumbnails.
+    """
+    image = shrink(open_image(name), IMAGE_MAX_SIZE)
+    new_name = replace(converted_name(name), encode(image))
+    if not Recipes.objects.filter(pk=recipe_id, image=name).update(
+            image=new_name):
+        default_storage.delete(new_name)
+        return
+    if new_name != name:
+        default_storage.delete(name)
+    Recipes.objects.filter(pk=recipe_id, image=new_name).update(
+        thumbnails=save_thumbnails(new_name, image, THUMBNAIL_SIZES))
+
+
+def process_logged(recipe_id, name):
+    """
+    process_recipe_image after the recipe is saved: a failure is logged
+    and the uploaded original stays in use.
+    """
+    try:
+        process_recipe_image(recipe_id, name)
+    except Exception:
+        logger.exception('Recipe %s image %s was not processed',
+                         recipe_id, name)
+
+
+def process_in_background(recipe_id, name):
+    try:
+        process_logged(recipe_id, name)
+    finally:
+        connections.close_all()
+
+
+def schedule_recipe_image(recipe):
+    """
+    Process the recipe image in the request thread or, with
+    settings.RECIPE_IMAGE_WORKERS, in a thread pool after the response.
+    """
+    global executor
+    if not settings.RECIPE_IMAGE_WORKERS:
+        process_logged(recipe.pk, recipe.image.name)
+        return
+    with executor_lock:
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images')
+    executor.submit(process_in_background, recipe.pk, recipe.image.name)
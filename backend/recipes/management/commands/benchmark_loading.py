@@ -0,0 +1,71 @@
+import csv
+import io
+import os
+import random
+import tempfile
+import time
+
+from django.core.management import BaseCommand, call_command
+from django.db import connection, transaction
+from recipes.models import Ingredients
+
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = ('Compare load_ingredients modes on a synthetic csv; every '
+            'load is rolled back')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--existing', type=float, default=0.5,
+                            help='share of the rows already in the table '
+                                 'for --skip-existing')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        rows = [(f'Ингредиент {number}', rng.choice(UNITS))
+                for number in range(options['rows'])]
+        existing = rows[:int(len(rows) * options['existing'])]
+        modes = [('bulk_create', {}, []),
+                 ('skip_existing', {'skip_existing': True}, existing)]
+        if connection.vendor == 'postgresql':
+            modes.append(('copy', {'copy': True}, []))
+        else:
+            self.stdout.write('copy: skipped, needs PostgreSQL')
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'ingredients.csv')
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                csv.writer(f).writerows(rows)
+            for name, extra, preloaded in modes:
+                seconds = self.measure(path, options['batch_size'], extra,
+                                       preloaded)
+                self.stdout.write(
+                    f'{name:<14} {seconds:7.2f}s '
+                    f'{len(rows) / seconds:9.0f} rows/s')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(rows)} rows, batch size {options["batch_size"]}'))
+
+    @staticmethod
+    def measure(path, batch_size, extra, preloaded):
+        """:return: seconds of load_ingredients, its writes rolled back"""
+        try:
+            with transaction.atomic():
+                Ingredients.objects.bulk_create(
+                    (Ingredients(name=name, measurement_unit=unit)
+                     for name, unit in preloaded), batch_size=batch_size)
+                started = time.perf_counter()
+                call_command('load_ingredients', path=path,
+                             batch_size=batch_size, stdout=io.StringIO(),
+                             **extra)
+                seconds = time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            return seconds
@@ -0,0 +1,189 @@
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+from django.conf import settings
+from django.core.management import BaseCommand
+from django.db import connections
+from recipes.models import IngredientCount, Recipes
+from recipes.similar import read_neighbours, write_neighbours
+from scipy import sparse
+
+# Matrix of all recipes in the pool processes: columns present in more
+# than FREQUENT_SHARE of recipes (tags) as a dense array, as their
+# products are nearly dense, the rest as a sparse matrix
+FREQUENT_SHARE = 0.01
+frequent = None
+rare = None
+
+
+def recipe_matrix():
+    """
+    :return: (sorted recipe ids, L2-normalised TF-IDF matrix with a row
+        per recipe and a column per ingredient and per tag)
+    """
+    ids = np.array(Recipes.objects.order_by('pk').values_list(
+        'pk', flat=True), dtype=np.int64)
+    terms = (
+        IngredientCount.objects.order_by().values_list('recipe',
+                                                       'ingredient'),
+        Recipes.tag.through.objects.order_by().values_list('recipes',
+                                                           'tags'),
+    )
+    columns = []
+    for pairs in terms:
+        pairs = np.array(list(pairs), dtype=np.int64).reshape(-1, 2)
+        values, column = np.unique(pairs[:, 1], return_inverse=True)
+        columns.append((np.searchsorted(ids, pairs[:, 0]), column,
+                        len(values)))
+    rows = np.concatenate([row for row, _, _ in columns])
+    column = np.concatenate([
+        column + sum(size for _, _, size in columns[:number])
+        for number, (_, column, _) in enumerate(columns)])
+    shape = (len(ids), sum(size for _, _, size in columns))
+    counts = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, column)), shape=shape)
+    counts.data[:] = 1
+    frequency = np.bincount(counts.indices, minlength=shape[1])
+    idf = np.log((1 + shape[0]) / (1 + frequency)) + 1
+    weights = sparse.csr_matrix(counts.multiply(idf.astype(np.float32)))
+    norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)))
+    norms[norms == 0] = 1
+    return ids, sparse.csr_matrix(weights.multiply(1 / norms))
+
+
+def init_worker(matrix):
+    global frequent, rare
+    matrix = sparse.csc_matrix(matrix)
+    columns = np.diff(matrix.indptr) > FREQUENT_SHARE * matrix.shape[0]
+    frequent = matrix[:, columns].toarray()
+    rare = sparse.csr_matrix(matrix[:, ~columns])
+
+
+def top_neighbours(rows, top):
+    """
+    :param rows: matrix rows
+    :return: (N x top neighbour rows, -1 pads; N x top similarities)
+    """
+    products = frequent[rows] @ frequent.T
+    rare_products = sparse.coo_matrix(rare[rows] @ rare.T)
+    products[rare_products.row, rare_products.col] += rare_products.data
+    products[np.arange(len(rows)), rows] = 0
+    neighbours = np.full((len(rows), top), -1, dtype=np.int64)
+    scores = np.zeros((len(rows), top), dtype=np.float32)
+    count = min(top, products.shape[1] - 1)
+    if count > 0:
+        best = np.argpartition(products, -count, axis=1)[:, -count:]
+        values = np.take_along_axis(products, best, 1)
+        best, values = best_first(best, values, count)
+        found = values > 0
+        neighbours[:, :count] = np.where(found, best, -1)
+        scores[:, :count] = np.where(found, values, 0)
+    return neighbours, scores
+
+
+def best_first(neighbours, scores, top):
+    """Sort rows by similarity, then newer recipe first, keep top."""
+    order = np.lexsort((-neighbours, -scores))[..., :top]
+    return (np.take_along_axis(neighbours, order, -1),
+            np.take_along_axis(scores, order, -1))
+
+
+class Command(BaseCommand):
+    help = ('Precompute similar recipes by ingredients and tags for '
+            '/api/recipes/{id}/similar/')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--update', action='store_true',
+                            help='only add recipes missing from the file')
+        parser.add_argument('--top', type=int,
+                            default=settings.SIMILAR_RECIPES_TOP)
+        parser.add_argument('--workers', type=int,
+                            default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=200)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        path = settings.SIMILAR_RECIPES_FILE
+        top = options['top']
+        ids, recipes = recipe_matrix()
+        previous = None
+        if options['update'] and os.path.exists(path):
+            previous = read_neighbours(path)
+            if previous[1].shape[1] != top:
+                self.stdout.write('Number of neighbours changed, full build')
+                previous = None
+
+        if previous is None:
+            rows = np.arange(len(ids))
+        else:
+            rows = np.flatnonzero(~np.isin(ids, previous[0]))
+        found, scores = self.compute(recipes, rows, top, options)
+        found = np.where(found >= 0, ids[np.maximum(found, 0)], -1)
+        if previous is None:
+            neighbours = found
+        else:
+            neighbours, scores = self.merge(ids, rows, found, scores,
+                                            previous, top)
+        write_neighbours(path, ids, neighbours, scores)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(rows)} of {len(ids)} recipes, {recipes.shape[1]} terms, '
+            f'{time.monotonic() - started:.1f}s: {path}'))
+
+    def compute(self, recipes, rows, top, options):
+        """top_neighbours of the rows in batches over a process pool"""
+        batches = [rows[start:start + options['batch_size']]
+                   for start in range(0, len(rows), options['batch_size'])]
+        if not batches:
+            return (np.empty((0, top), dtype=np.int64),
+                    np.empty((0, top), dtype=np.float32))
+        if options['workers'] > 1:
+            # Forked processes must not share the database connection
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers'],
+                                     initializer=init_worker,
+                                     initargs=(recipes,)) as pool:
+                results = list(pool.map(top_neighbours, batches,
+                                        repeat(top)))
+        else:
+            init_worker(recipes)
+            results = list(map(top_neighbours, batches, repeat(top)))
+        return (np.concatenate([neighbours for neighbours, _ in results]),
+                np.concatenate([scores for _, scores in results]))
+
+    @staticmethod
+    def merge(ids, rows, found, found_scores, previous, top):
+        """
+        Neighbours of the previous file without deleted recipes, the new
+        rows, and new recipes among the neighbours of the older ones.
+        Similarities of older pairs are not recomputed until a full build.
+        """
+        old_ids, old_neighbours, old_scores = previous
+        kept = np.isin(old_ids, ids)
+        alive = np.isin(old_neighbours[kept], ids)
+        neighbours = np.full((len(ids), top), -1, dtype=np.int64)
+        scores = np.zeros((len(ids), top), dtype=np.float32)
+        positions = np.searchsorted(ids, old_ids[kept])
+        neighbours[positions] = np.where(alive, old_neighbours[kept], -1)
+        scores[positions] = np.where(alive, old_scores[kept], 0)
+        neighbours[rows] = found
+        scores[rows] = found_scores
+
+        candidates = defaultdict(list)
+        new = set(rows.tolist())
+        for row, recipe_neighbours, recipe_scores in zip(rows, found,
+                                                         found_scores):
+            for neighbour, score in zip(recipe_neighbours, recipe_scores):
+                position = np.searchsorted(ids, neighbour)
+                if neighbour >= 0 and position not in new:
+                    candidates[position].append((ids[row], score))
+        for position, extra in candidates.items():
+            neighbours[position], scores[position] = best_first(
+                np.concatenate([neighbours[position],
+                                [recipe for recipe, _ in extra]]),
+                np.concatenate([scores[position],
+                                [score for _, score in extra]]), top)
+        return best_first(neighbours, scores, top)
@@ -1,20 +1,130 @@
 import csv
+import io
+import json
+import os
+import time
+from itertools import islice
 
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
 from recipes.models import Ingredients
+from recipes.signals import invalidate_reference
+
+FORMATS = ('csv', 'json')
+
+
+def read_csv(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        reader = csv.reader(f, delimiter=',')
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < 2:
+                raise CommandError(f'{path}, line {reader.line_num}: '
+                                   f'expected name,measurement_unit')
+            yield row[0], row[1]
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for number, row in enumerate(json.load(f)):
+            try:
+                yield row['name'], row['measurement_unit']
+            except (KeyError, TypeError):
+                raise CommandError(f'{path}, item {number}: expected '
+                                   f'name and measurement_unit')
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    batch = list(islice(rows, size))
+    while batch:
+        yield batch
+        batch = list(islice(rows, size))
 
 
 class Command(BaseCommand):
-    help = 'Load Ingredients from csv'
+    help = 'Load Ingredients from csv or json'
 
     def add_arguments(self, parser):
-        parser.add_argument('--path', type=str)
+        parser.add_argument('--path', type=str, required=True)
+        parser.add_argument('--format', choices=FORMATS,
+                            help='by default taken from the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--skip-existing', action='store_true',
+                            help='skip rows whose (name, measurement_unit) '
+                                 'is already in the database or repeated '
+                                 'in the file')
+        parser.add_argument('--copy', action='store_true',
+                            help='use PostgreSQL COPY instead of '
+                                 'bulk_create')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='read and count rows, write nothing')
 
     def handle(self, *args, **options):
         path = options['path']
-        with open(path, 'r', encoding='utf-8') as f:
-            reader = csv.reader(f, delimiter=',')
-            for row in reader:
-                Ingredients.objects.create(
-                    name=row[0],
-                    measurement_unit=row[1])
+        file_format = (options['format']
+                       or os.path.splitext(path)[1].lstrip('.').lower())
+        if file_format not in FORMATS:
+            raise CommandError(f'Unknown file format: {file_format}')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy works only with PostgreSQL')
+
+        rows = READERS[file_format](path)
+        if options['skip_existing']:
+            rows = self.skip_existing(rows)
+        write = self.copy_batch if options['copy'] else self.create_batch
+
+        loaded = 0
+        started = time.monotonic()
+        with transaction.atomic():
+            for batch in batches(rows, options['batch_size']):
+                if not options['dry_run']:
+                    write(batch)
+                loaded += len(batch)
+                self.report(loaded, started)
+        if loaded and not options['dry_run']:
+            invalidate_reference(Ingredients)
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Checked" if options["dry_run"] else "Loaded"} {loaded} '
+            f'ingredients in {time.monotonic() - started:.2f}s'))
+
+    @staticmethod
+    def skip_existing(rows):
+        seen = set(Ingredients.objects.values_list('name',
+                                                   'measurement_unit'))
+        for row in rows:
+            if row not in seen:
+                seen.add(row)
+                yield row
+
+    @staticmethod
+    def create_batch(batch):
+        Ingredients.objects.bulk_create(
+            Ingredients(name=name, measurement_unit=measurement_unit)
+            for name, measurement_unit in batch)
+
+    @staticmethod
+    def copy_batch(batch):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(batch)
+        buffer.seek(0)
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.copy_expert(
+                f'COPY {quote(Ingredients._meta.db_table)} '
+                f'({quote("name")}, {quote("measurement_unit")}) '
+                f'FROM STDIN WITH (FORMAT csv)', buffer)
+
+    def report(self, loaded, started):
+        elapsed = time.monotonic() - started
+        rate = loaded / elapsed if elapsed else 0
+        self.stdout.write(f'{loaded} rows, {rate:.0f} rows/s')
@@ -0,0 +1,48 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management import BaseCommand
+from django.db import connections
+from recipes.images import make_thumbnails
+from recipes.models import Recipes
+
+
+def make_recipe_thumbnails(args):
+    name, force = args
+    try:
+        return (name, *make_thumbnails(name, force=force), None)
+    except Exception as error:
+        return name, 0, None, error
+
+
+class Command(BaseCommand):
+    help = ('Generate missing thumbnails for recipe images and record '
+            'them on the recipes')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=None,
+                            help='processes, by default the number of CPUs')
+        parser.add_argument('--force', action='store_true',
+                            help='regenerate existing thumbnails')
+
+    def handle(self, *args, **options):
+        names = list(Recipes.objects.exclude(image='').values_list(
+            'image', flat=True))
+        connections.close_all()
+        started = time.monotonic()
+        written = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for name, count, thumbnails, error in pool.map(
+                    make_recipe_thumbnails,
+                    ((name, options['force']) for name in names),
+                    chunksize=16):
+                written += count
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f'{name}: {error}')
+                else:
+                    Recipes.objects.filter(image=name).update(
+                        thumbnails=thumbnails)
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(names)} images, {written} thumbnails written, '
+            f'{failed} failed in {time.monotonic() - started:.2f}s'))
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Sum
+from recipes.models import ShoppingCart, ShoppingCartTotal
+
+BATCH_SIZE = 1000
+# Totals are float sums updated in steps
+TOLERANCE = 1e-6
+
+
+class Command(BaseCommand):
+    help = ('Check shopping cart totals against the carts and fix them, '
+            'e.g. after bulk loads that send no signals')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='only report stale totals')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        with transaction.atomic():
+            actual = {
+                (row['user'], row['recipe__ingredientcount__ingredient']):
+                    (row['total'], row['recipes'])
+                for row in ShoppingCart.objects.filter(
+                    recipe__ingredientcount__isnull=False).order_by().values(
+                    'user', 'recipe__ingredientcount__ingredient').annotate(
+                    total=Sum('recipe__ingredientcount__count'),
+                    recipes=Count('recipe', distinct=True)).iterator()}
+            stale, extra = [], []
+            for row in ShoppingCartTotal.objects.order_by().iterator():
+                total, recipes = actual.pop((row.user_id, row.ingredient_id),
+                                            (None, 0))
+                if total is None:
+                    extra.append(row.pk)
+                elif (abs(row.total - total) > TOLERANCE * max(1, total)
+                        or row.recipes != recipes):
+                    row.total, row.recipes = total, recipes
+                    stale.append(row)
+            missing = [
+                ShoppingCartTotal(user_id=user, ingredient_id=ingredient,
+                                  total=total, recipes=recipes)
+                for (user, ingredient), (total, recipes) in actual.items()]
+            if not options['dry_run']:
+                ShoppingCartTotal.objects.bulk_update(
+                    stale, ['total', 'recipes'], batch_size=BATCH_SIZE)
+                ShoppingCartTotal.objects.bulk_create(missing,
+                                                      batch_size=BATCH_SIZE)
+                for start in range(0, len(extra), BATCH_SIZE):
+                    ShoppingCartTotal.objects.filter(
+                        pk__in=extra[start:start + BATCH_SIZE]).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f'Cart totals: {len(stale)} stale, {len(missing)} missing, '
+            f'{len(extra)} extra'
+            f'{" (not fixed)" if options["dry_run"] else ""} '
+            f'in {time.monotonic() - started:.1f}s'))
@@ -0,0 +1,53 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from recipes import feed
+from recipes.models import FeedEntry, Follow
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Rebuild subscription feeds, e.g. after bulk loads that send '
+            'no signals, or trim them to FEED_MAX_ENTRIES')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=str,
+                            help='username, by default all users')
+        parser.add_argument('--trim', action='store_true',
+                            help='only delete entries over FEED_MAX_ENTRIES')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        if options['user']:
+            users = [User.objects.get(username=options['user']).pk]
+        elif options['trim']:
+            users = list(FeedEntry.objects.order_by().values('user').annotate(
+                total=Count('pk')).filter(
+                total__gt=settings.FEED_MAX_ENTRIES).values_list(
+                'user', flat=True))
+        else:
+            users = list(Follow.objects.order_by('user').values_list(
+                'user', flat=True).distinct())
+            FeedEntry.objects.exclude(user__in=users).delete()
+
+        done = deleted = 0
+        for user in users:
+            with transaction.atomic():
+                if options['trim']:
+                    deleted += feed.trim(user)
+                else:
+                    feed.rebuild(user)
+            done += 1
+            if done % 1000 == 0:
+                self.stdout.write(
+                    f'{done} users, '
+                    f'{done / (time.monotonic() - started):.0f}/s')
+        self.stdout.write(self.style.SUCCESS(
+            f'{"Trimmed" if options["trim"] else "Rebuilt"} {done} feeds'
+            f'{f", {deleted} entries deleted" if options["trim"] else ""} '
+            f'in {time.monotonic() - started:.1f}s'))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management import BaseCommand
+from recipes.models import Recipes
+from recipes.search import update_documents
+
+
+class Command(BaseCommand):
+    help = ('Rebuild recipe search documents, e.g. after bulk loads that '
+            'send no signals')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        ids = list(Recipes.objects.order_by('pk').values_list('pk',
+                                                              flat=True))
+        started = time.monotonic()
+        done = 0
+        for start in range(0, len(ids), options['batch_size']):
+            done += update_documents(Recipes.objects.filter(
+                pk__in=ids[start:start + options['batch_size']]))
+            self.stdout.write(f'{done} recipes, '
+                              f'{done / (time.monotonic() - started):.0f}/s')
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {done} search documents in '
+            f'{time.monotonic() - started:.1f}s'))
@@ -0,0 +1,72 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import (AuthorStats, Favorites, Follow, Recipes,
+                            ShoppingCart)
+
+
+def count_by_recipe(model):
+    return Coalesce(Subquery(
+        model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+            'recipe').annotate(total=Count('pk')).values('total'),
+        output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = 'Recompute recipe and author counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='only report stale counters')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipes = self.recount_recipes(options['dry_run'])
+            authors = self.recount_authors(options['dry_run'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Stale counters: {recipes} recipes, {authors} authors'
+            f'{" (not fixed)" if options["dry_run"] else ""}'))
+
+    @staticmethod
+    def recount_recipes(dry_run):
+        counters = {'favorites_count': count_by_recipe(Favorites),
+                    'shopping_cart_count': count_by_recipe(ShoppingCart)}
+        stale = Recipes.objects.annotate(
+            actual_favorites=counters['favorites_count'],
+            actual_cart=counters['shopping_cart_count'],
+        ).exclude(favorites_count=F('actual_favorites'),
+                  shopping_cart_count=F('actual_cart')).count()
+        if stale and not dry_run:
+            Recipes.objects.update(**counters)
+        return stale
+
+    @staticmethod
+    def recount_authors(dry_run):
+        counted = {
+            'recipes_count': Recipes.objects.exclude(author=None),
+            'followers_count': Follow.objects.all(),
+        }
+        actual = {field: dict(queryset.order_by().values('author').annotate(
+            total=Count('pk')).values_list('author', 'total'))
+            for field, queryset in counted.items()}
+        stats = {row.author_id: row for row in AuthorStats.objects.all()}
+        to_update = []
+        for author_id, row in stats.items():
+            stale = False
+            for field, totals in actual.items():
+                if getattr(row, field) != totals.get(author_id, 0):
+                    setattr(row, field, totals.get(author_id, 0))
+                    stale = True
+            if stale:
+                to_update.append(row)
+        to_create = [
+            AuthorStats(author_id=author_id, **{
+                field: totals.get(author_id, 0)
+                for field, totals in actual.items()})
+            for author_id in set().union(*actual.values()) - set(stats)]
+        if not dry_run:
+            AuthorStats.objects.bulk_update(to_update, list(actual),
+                                            batch_size=1000)
+            AuthorStats.objects.bulk_create(to_create, batch_size=1000)
+        return len(to_update) + len(to_create)
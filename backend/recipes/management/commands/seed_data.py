@@ -0,0 +1,207 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import BaseCommand, call_command
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+from recipes.images import encode
+from recipes.models import (Favorites, Follow, IngredientCount, Ingredients,
+                            Recipes, ShoppingCart, Tags)
+from recipes.signals import invalidate_reference, reset_recipe_changes
+
+User = get_user_model()
+
+BATCH_SIZE = 2000
+IMAGE_NAME = 'recipe/seed.webp'
+PASSWORD = 'seed-password'
+
+
+def popularity(count, rng):
+    """Cumulative long-tailed weights: a few items get most of the
+    attention."""
+    return list(accumulate(rng.paretovariate(1.2) for _ in range(count)))
+
+
+@contextmanager
+def explicit_pub_date():
+    """
+    Let bulk_create keep the pub_date of Recipes instead of auto_now_add.
+    The field is shared by the whole process, so it is switched back
+    right after.
+    """
+    field = Recipes._meta.get_field('pub_date')
+    auto_now_add = field.auto_now_add
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = auto_now_add
+
+
+def weighted_sample(population, cum_weights, size, rng):
+    size = min(size, len(population))
+    chosen = set()
+    while len(chosen) < size:
+        chosen.update(rng.choices(population, cum_weights=cum_weights,
+                                  k=size - len(chosen)))
+    return list(chosen)
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+class Command(BaseCommand):
+    help = ('Seed users, recipes, ingredients, tags, follows, favorites and '
+            'shopping carts for benchmarks')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--authors-share', type=float, default=0.2)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--ingredients', type=int, default=2000,
+                            help='catalogue size, existing rows are reused')
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='max follows per user')
+        parser.add_argument('--favorites', type=int, default=30,
+                            help='max favorites per user')
+        parser.add_argument('--cart', type=int, default=10,
+                            help='max shopping cart recipes per user')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        started = time.monotonic()
+        with transaction.atomic():
+            tags = self.seed_tags(options['tags'])
+            ingredients = self.seed_ingredients(options['ingredients'])
+            users = self.seed_users(options['users'])
+            authors_count = int(len(users) * options['authors_share'])
+            authors = users[:max(1, authors_count)]
+            recipes = self.seed_recipes(options['recipes'], authors, tags,
+                                        ingredients)
+            self.seed_follows(users, authors, options['follows'])
+            self.seed_marks(Favorites, users, recipes, options['favorites'])
+            self.seed_marks(ShoppingCart, users, recipes, options['cart'])
+            self.reset_sequences()
+        invalidate_reference(Tags)
+        invalidate_reference(Ingredients)
+        reset_recipe_changes()
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('rebuild_cart_totals', stdout=self.stdout)
+        call_command('rebuild_search', stdout=self.stdout)
+        call_command('rebuild_feed', stdout=self.stdout)
+        call_command('build_similar', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded in {time.monotonic() - started:.1f}s; password of the '
+            f'seed users: {PASSWORD}'))
+
+    def seed_tags(self, count):
+        existing = Tags.objects.count()
+        Tags.objects.bulk_create(
+            Tags(name=f'Тег {number}', slug=f'seed-tag-{number}',
+                 color='#{:06x}'.format(self.rng.randrange(0xFFFFFF)))
+            for number in range(existing, count))
+        return list(Tags.objects.values_list('id', flat=True))
+
+    def seed_ingredients(self, count):
+        existing = Ingredients.objects.count()
+        Ingredients.objects.bulk_create(
+            (Ingredients(name=f'ингредиент {number}',
+                         measurement_unit=self.rng.choice(('г', 'шт', 'мл')))
+             for number in range(existing, count)),
+            batch_size=BATCH_SIZE)
+        return list(Ingredients.objects.values_list('id', flat=True))
+
+    def seed_users(self, count):
+        password = make_password(PASSWORD)
+        first_id = next_id(User)
+        User.objects.bulk_create(
+            (User(id=first_id + number, username=f'seed{first_id + number}',
+                  email=f'seed{first_id + number}@example.com',
+                  first_name='Seed', last_name=str(first_id + number),
+                  password=password)
+             for number in range(count)),
+            batch_size=BATCH_SIZE)
+        self.stdout.write(f'{count} users')
+        return list(range(first_id, first_id + count))
+
+    def seed_recipes(self, count, authors, tags, ingredients):
+        if not default_storage.exists(IMAGE_NAME):
+            default_storage.save(IMAGE_NAME, ContentFile(
+                encode(Image.new('RGB', (640, 480), '#e0a060'))))
+        author_weights = popularity(len(authors), self.rng)
+        ingredient_weights = popularity(len(ingredients), self.rng)
+        first_id = next_id(Recipes)
+        now = timezone.now()
+        for start in range(0, count, BATCH_SIZE):
+            ids = range(first_id + start,
+                        first_id + min(start + BATCH_SIZE, count))
+            recipes = [
+                Recipes(id=pk,
+                        author_id=self.rng.choices(
+                            authors, cum_weights=author_weights)[0],
+                        name=f'Рецепт {pk}',
+                        text=f'Описание рецепта {pk}. ' * 10,
+                        image=IMAGE_NAME,
+                        cooking_time=self.rng.randint(5, 180),
+                        pub_date=now - timedelta(
+                            minutes=first_id + count - pk))
+                for pk in ids]
+            with explicit_pub_date():
+                Recipes.objects.bulk_create(recipes)
+            Recipes.tag.through.objects.bulk_create(
+                Recipes.tag.through(recipes_id=pk, tags_id=tag)
+                for pk in ids
+                for tag in self.rng.sample(
+                    tags, min(len(tags), self.rng.randint(1, 3))))
+            IngredientCount.objects.bulk_create(
+                IngredientCount(recipe_id=pk, ingredient_id=ingredient,
+                                count=self.rng.randint(1, 500))
+                for pk in ids
+                for ingredient in weighted_sample(
+                    ingredients, ingredient_weights,
+                    self.rng.randint(3, 12), self.rng))
+            self.stdout.write(f'{ids[-1] - first_id + 1} recipes')
+        return list(range(first_id, first_id + count))
+
+    def seed_follows(self, users, authors, max_follows):
+        weights = popularity(len(authors), self.rng)
+        Follow.objects.bulk_create(
+            (Follow(user_id=user, author_id=author)
+             for user in users
+             for author in weighted_sample(
+                 authors, weights, self.rng.randint(0, max_follows),
+                 self.rng)
+             if author != user),
+            batch_size=BATCH_SIZE, ignore_conflicts=True)
+        self.stdout.write('follows')
+
+    def seed_marks(self, model, users, recipes, max_marks):
+        weights = popularity(len(recipes), self.rng)
+        model.objects.bulk_create(
+            (model(user_id=user, recipe_id=recipe)
+             for user in users
+             for recipe in weighted_sample(
+                 recipes, weights, self.rng.randint(0, max_marks),
+                 self.rng)),
+            batch_size=BATCH_SIZE, ignore_conflicts=True)
+        self.stdout.write(model._meta.verbose_name_plural)
+
+    @staticmethod
+    def reset_sequences():
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(),
+                                                         [User, Recipes]):
+                cursor.execute(sql)
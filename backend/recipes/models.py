@@ -1,7 +1,9 @@
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinValueValidator
 from django.db import models
-from django.db.models import CheckConstraint, Q
+from django.db.models import (BooleanField, CheckConstraint, Exists, OuterRef,
+                              Prefetch, Q, Subquery, Value)
 
 User = get_user_model()
 
@@ -33,16 +35,60 @@ class Ingredients(models.Model):
         verbose_name_plural = 'Ингредиенты'
 
 
+MIN_INGREDIENT_COUNT = 0.1
+
+
 class IngredientCount(models.Model):
     ingredient = models.ForeignKey(Ingredients,
                                    on_delete=models.PROTECT)
     recipe = models.ForeignKey('Recipes',
                                on_delete=models.CASCADE)
-    count = models.FloatField(validators=[MinValueValidator(0.1)])
+    count = models.FloatField(
+        validators=[MinValueValidator(MIN_INGREDIENT_COUNT)])
 
     class Meta:
-        constraints = [CheckConstraint(check=Q(count__gte=0.1),
-                                       name='count_min')]
+        constraints = [CheckConstraint(
+            check=Q(count__gte=MIN_INGREDIENT_COUNT), name='count_min')]
+        # Ingredients of recipes without reading the table rows
+        indexes = [models.Index(fields=['recipe', 'ingredient', 'count'],
+                                name='ingredientcount_recipe_idx')]
+
+
+class RecipesQuerySet(models.QuerySet):
+    def with_user_flags(self, user):
+        """
+        :param user: request user
+        :return: queryset with is_favorited and is_in_shopping_cart
+        """
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()))
+        return self.annotate(
+            is_favorited=Exists(Favorites.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
+
+    def with_related(self, user):
+        """
+        Prefetch plan for RecipesSerializer: author with is_subscribed,
+        tags and ingredients with their names.
+        :param user: request user
+        :return: queryset
+        """
+        if user.is_authenticated:
+            is_subscribed = Exists(Follow.objects.filter(
+                user=user, author=OuterRef('pk')))
+        else:
+            is_subscribed = Value(False, output_field=BooleanField())
+        return self.with_user_flags(user).prefetch_related(
+            Prefetch('author', queryset=User.objects.annotate(
+                is_subscribed=is_subscribed)),
+            'tag',
+            Prefetch('ingredientcount_set',
+                     queryset=IngredientCount.objects.select_related(
+                         'ingredient')))
 
 
 class Recipes(models.Model):
@@ -54,6 +100,8 @@ class Recipes(models.Model):
     text = models.TextField(verbose_name='Описание')
     image = models.ImageField(verbose_name='Картинка', blank=False,
                               upload_to='recipe/')
+    # Names of the written thumbnails by size, kept by recipes.images
+    thumbnails = models.JSONField(default=dict, blank=True, editable=False)
     ingredient = models.ManyToManyField(
         Ingredients,
         related_name='use_ingredient',
@@ -70,16 +118,63 @@ class Recipes(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name='В избранном', default=0, editable=False)
+    shopping_cart_count = models.PositiveIntegerField(
+        verbose_name='В списках покупок', default=0, editable=False)
+
+    objects = RecipesQuerySet.as_manager()
 
     def __str__(self):
         return self.name
 
     class Meta:
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            # ?author= and the latest recipes of subscriptions
+            models.Index(fields=['author', '-pub_date', '-id'],
+                         name='recipe_author_pub_date_idx'),
+            # ?ordering=popular
+            models.Index(fields=['-favorites_count', '-pub_date', '-id'],
+                         name='recipe_popular_idx'),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
 
+class RecipeSearch(models.Model):
+    """
+    Full-text document of the recipe, kept by recipes.search. On SQLite
+    the FTS5 table of recipes.search is used instead.
+    """
+    recipe = models.OneToOneField(
+        Recipes,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='search')
+    vector = SearchVectorField(null=True)
+
+
+class FollowQuerySet(models.QuerySet):
+    def with_recipes(self, recipes_limit=None):
+        """
+        Author with its counters (author.stats) and its latest recipes
+        in author.latest_recipes.
+        :param recipes_limit: recipes per author, None for all
+        :return: queryset
+        """
+        recipes = Recipes.objects.all()
+        if recipes_limit is not None:
+            recipes = recipes.filter(id__in=Subquery(
+                Recipes.objects.filter(
+                    author=OuterRef('author')).values('id')[:recipes_limit]))
+        return self.select_related('author__stats').prefetch_related(
+            Prefetch('author__author_recipe', queryset=recipes,
+                     to_attr='latest_recipes'))
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -90,10 +185,15 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following')
 
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         constraints = [models.UniqueConstraint(
             fields=['user', 'author'],
             name='uniq_follow')]
+        # Subscriptions page of a user
+        indexes = [models.Index(fields=['user', 'id'],
+                                name='follow_user_id_idx')]
 
 
 class Favorites(models.Model):
@@ -128,3 +228,77 @@ class ShoppingCart(models.Model):
         constraints = [models.UniqueConstraint(
             fields=['user', 'recipe'],
             name='uniq_shopping')]
+
+
+class ShoppingCartTotal(models.Model):
+    """
+    Ingredient of the user's shopping cart summed over its recipes, kept
+    by recipes.cart.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals')
+    ingredient = models.ForeignKey(
+        Ingredients,
+        on_delete=models.CASCADE,
+        related_name='+')
+    total = models.FloatField(default=0)
+    # Cart recipes with the ingredient, the row is deleted at zero
+    recipes = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'ingredient'],
+            name='uniq_cart_total')]
+
+
+class AuthorStats(models.Model):
+    """Counters of the user as an author, kept by recipes.signals."""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats')
+    recipes_count = models.PositiveIntegerField(
+        verbose_name='Рецептов', default=0)
+    followers_count = models.PositiveIntegerField(
+        verbose_name='Подписчиков', default=0)
+
+    class Meta:
+        verbose_name = 'Статистика автора'
+        verbose_name_plural = 'Статистика авторов'
+
+
+class FeedEntry(models.Model):
+    """
+    Recipe of a followed author in the feed of the user, kept by
+    recipes.feed. Recipes of authors with many followers are not copied
+    and are read from Recipes instead.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed')
+    recipe = models.ForeignKey(
+        Recipes,
+        on_delete=models.CASCADE,
+        related_name='feed_entries')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [models.UniqueConstraint(
+            fields=['user', 'recipe'],
+            name='uniq_feed_entry')]
+        indexes = [
+            # Feed page and trimming
+            models.Index(fields=['user', '-pub_date', '-recipe'],
+                         name='feed_user_pub_date_idx'),
+            # Unfollow
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
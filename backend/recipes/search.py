@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector)
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Subquery
+
+from .models import IngredientCount, Recipes, RecipeSearch
+
+# SQLite stand-in for RecipeSearch, rowid is the recipe id
+FTS_TABLE = 'recipes_search_fts'
+FTS_TABLE_SQL = (f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING '
+                 f'fts5(name, text, ingredients)')
+# Column weights of the rank column as A, B and C of the tsvector
+FTS_RANK_SQL = (f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) "
+                f"VALUES ('rank', 'bm25(10.0, 4.0, 1.0)')")
+PG_INDEX_SQL = ('CREATE INDEX IF NOT EXISTS recipes_search_vector_idx '
+                'ON {table} USING gin (vector)')
+BATCH_SIZE = 500
+
+
+def create_search_table(connection):
+    """GIN index on PostgreSQL, FTS5 table on SQLite (recipes.signals)."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(PG_INDEX_SQL.format(
+                table=connection.ops.quote_name(
+                    RecipeSearch._meta.db_table)))
+        elif connection.vendor == 'sqlite':
+            cursor.execute(FTS_TABLE_SQL)
+            cursor.execute(FTS_RANK_SQL)
+
+
+def document():
+    """
+    tsvector of the recipe (OuterRef('recipe')): name (A), text (B) and
+    ingredient names (C).
+    """
+    config = settings.RECIPE_SEARCH_CONFIG
+    ingredients = Subquery(
+        IngredientCount.objects.filter(recipe=OuterRef('pk')).order_by()
+        .values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')).values('names'))
+    return Subquery(Recipes.objects.filter(pk=OuterRef('recipe')).annotate(
+        document=SearchVector('name', weight='A', config=config)
+        + SearchVector('text', weight='B', config=config)
+        + SearchVector(ingredients, weight='C', config=config),
+    ).values('document'))
+
+
+def update_documents(recipes):
+    """
+    Rebuild the search documents.
+    :param recipes: Recipes queryset
+    :return: number of recipes
+    """
+    ids = list(recipes.values_list('pk', flat=True))
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        if connection.vendor == 'postgresql':
+            RecipeSearch.objects.bulk_create(
+                (RecipeSearch(recipe_id=pk) for pk in batch),
+                ignore_conflicts=True)
+            RecipeSearch.objects.filter(recipe__in=batch).update(
+                vector=document())
+        else:
+            update_fts(batch)
+    return len(ids)
+
+
+def update_fts(ids):
+    rows = {pk: [name, text, []] for pk, name, text in
+            Recipes.objects.filter(pk__in=ids).values_list(
+                'pk', 'name', 'text')}
+    for recipe, name in IngredientCount.objects.filter(
+            recipe__in=ids).values_list('recipe', 'ingredient__name'):
+        rows[recipe][2].append(name)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', ids)
+        cursor.executemany(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text, ingredients) '
+            f'VALUES (%s, %s, %s, %s)',
+            [(pk, name, text, ' '.join(ingredients))
+             for pk, (name, text, ingredients) in rows.items()])
+
+
+def delete_document(recipe_id):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s',
+                           [recipe_id])
+
+
+def schedule_update(recipes):
+    """update_documents after the current transaction commits."""
+    transaction.on_commit(lambda: update_documents(recipes))
+
+
+def fts_query(value):
+    """Words of the search as quoted FTS5 strings, all required."""
+    return ' '.join('"{}"'.format(word.replace('"', '""'))
+                    for word in value.split())
+
+
+def search(queryset, value):
+    """
+    :param queryset: Recipes queryset
+    :param value: search words
+    :return: matching recipes ordered by rank, then newest first
+    """
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(value, config=settings.RECIPE_SEARCH_CONFIG,
+                            search_type='websearch')
+        queryset = queryset.filter(search__vector=query).annotate(
+            rank=SearchRank(F('search__vector'), query))
+    else:
+        match = fts_query(value)
+        if not match:
+            return queryset
+        # A join: MATCH in a correlated subquery runs once per recipe
+        table = connection.ops.quote_name(Recipes._meta.db_table)
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {table}.id',
+                   f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={'rank': f'-{FTS_TABLE}.rank'})
+    return queryset.order_by('-rank', '-pub_date', '-id')
@@ -0,0 +1,206 @@
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.db.models import F
+
+from .models import (AuthorStats, Favorites, Ingredients, Recipes,
+                     ShoppingCart)
+from . import cart, feed
+from .search import create_search_table, delete_document, schedule_update
+
+SEARCH_INDEXES_SQL = (
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ingredients_name_prefix_idx '
+    'ON {table} (lower(name) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS ingredients_name_trgm_idx '
+    'ON {table} USING gin (lower(name) gin_trgm_ops)',
+)
+
+
+def create_search_indexes(sender, using, **kwargs):
+    """
+    PostgreSQL-only indexes for IngredientSearchFilter and the recipe
+    search (the FTS5 table on SQLite). They are created after migrate
+    because migrations are generated on deploy and must stay applicable
+    to SQLite.
+    """
+    connection = connections[using]
+    create_search_table(connection)
+    if connection.vendor != 'postgresql':
+        return
+    table = connection.ops.quote_name(Ingredients._meta.db_table)
+    with connection.cursor() as cursor:
+        for sql in SEARCH_INDEXES_SQL:
+            cursor.execute(sql.format(table=table))
+
+
+def reference_state_key(model):
+    return f'reference:{model._meta.label_lower}:state'
+
+
+def reference_state(model):
+    """
+    :return: {'version': str, 'modified': unix time} of the model table
+    """
+    state = cache.get(reference_state_key(model))
+    if state is None:
+        state = invalidate_reference(model)
+    return state
+
+
+def invalidate_reference(sender, **kwargs):
+    """Receiver for Tags/Ingredients changes; also called after bulk
+    loads, which send no signals."""
+    state = {'version': uuid.uuid4().hex, 'modified': time.time()}
+    cache.set(reference_state_key(sender), state, timeout=None)
+    return state
+
+
+COUNTERS = {
+    Favorites: 'favorites_count',
+    ShoppingCart: 'shopping_cart_count',
+}
+
+
+def change_recipe_counter(sender, instance, delta):
+    field = COUNTERS[sender]
+    recipes = Recipes.objects.filter(pk=instance.recipe_id)
+    if delta < 0:
+        # Rows created before the counters (see recount_counters)
+        recipes = recipes.filter(**{f'{field}__gt': 0})
+    recipes.update(**{field: F(field) + delta})
+
+
+def recipe_marked(sender, instance, created, **kwargs):
+    """Receiver for Favorites/ShoppingCart post_save."""
+    if created:
+        change_recipe_counter(sender, instance, 1)
+
+
+def recipe_unmarked(sender, instance, **kwargs):
+    """Receiver for Favorites/ShoppingCart post_delete."""
+    change_recipe_counter(sender, instance, -1)
+
+
+def cart_recipe_added(sender, instance, created, **kwargs):
+    """Receiver for ShoppingCart post_save."""
+    if created:
+        cart.change_cart(instance.user_id, instance.recipe_id, 1)
+
+
+def cart_recipe_removed(sender, instance, **kwargs):
+    """Receiver for ShoppingCart pre_delete: the ingredients of a recipe
+    deleted with its carts are still there."""
+    cart.change_cart(instance.user_id, instance.recipe_id, -1)
+
+
+def change_author_counter(author_id, field, delta):
+    if author_id is None:
+        return
+    stats = AuthorStats.objects.filter(author_id=author_id)
+    if delta < 0:
+        stats = stats.filter(**{f'{field}__gt': 0})
+    if not stats.update(**{field: F(field) + delta}) and delta > 0:
+        # No row yet, or the author is being deleted with its stats
+        AuthorStats.objects.get_or_create(author_id=author_id)
+        AuthorStats.objects.filter(author_id=author_id).update(
+            **{field: F(field) + delta})
+
+
+def recipe_created(sender, instance, created, **kwargs):
+    """Receiver for Recipes post_save."""
+    if created:
+        change_author_counter(instance.author_id, 'recipes_count', 1)
+        feed.fan_out(instance)
+
+
+def recipe_deleted(sender, instance, **kwargs):
+    """Receiver for Recipes post_delete."""
+    change_author_counter(instance.author_id, 'recipes_count', -1)
+
+
+def follow_created(sender, instance, created, **kwargs):
+    """Receiver for Follow post_save."""
+    if created:
+        change_author_counter(instance.author_id, 'followers_count', 1)
+        feed.followers_changed(instance.author_id, 1)
+        feed.backfill(instance.user_id, instance.author_id)
+
+
+def follow_deleted(sender, instance, **kwargs):
+    """Receiver for Follow post_delete."""
+    change_author_counter(instance.author_id, 'followers_count', -1)
+    feed.unfollow(instance.user_id, instance.author_id)
+    feed.followers_changed(instance.author_id, -1)
+
+
+def ingredient_renamed(sender, instance, created, **kwargs):
+    """Receiver for Ingredients post_save: the name is in the recipe
+    search documents."""
+    if not created:
+        schedule_update(Recipes.objects.filter(
+            ingredientcount__ingredient=instance))
+
+
+def recipe_search_deleted(sender, instance, **kwargs):
+    """Receiver for Recipes post_delete."""
+    delete_document(instance.pk)
+
+
+# Change log of recipe ingredient sets for api.matching: a counter and
+# one key per change with the recipe id
+RECIPE_CHANGES_LAST_KEY = 'recipe-ingredients:last'
+RECIPE_CHANGES_KEEP = 10000
+RECIPE_CHANGES_TIMEOUT = 24 * 60 * 60
+
+
+def recipe_change_key(number):
+    return f'recipe-ingredients:{number}'
+
+
+def log_recipe_change(recipe_id):
+    try:
+        number = cache.incr(RECIPE_CHANGES_LAST_KEY)
+    except ValueError:
+        cache.add(RECIPE_CHANGES_LAST_KEY, 0, timeout=None)
+        number = cache.incr(RECIPE_CHANGES_LAST_KEY)
+    cache.set(recipe_change_key(number), recipe_id,
+              timeout=RECIPE_CHANGES_TIMEOUT)
+
+
+def recipe_ingredients_changed(recipe_id):
+    """Log the change after the current transaction commits. Called
+    explicitly: ingredients are saved with bulk_create."""
+    transaction.on_commit(lambda: log_recipe_change(recipe_id))
+
+
+def recipe_changes(since):
+    """
+    :param since: number of the last change already seen
+    :return: (number of the last change, set of recipe ids changed
+        after since or None if the log no longer has them)
+    """
+    last = cache.get(RECIPE_CHANGES_LAST_KEY, 0)
+    if since is None or last < since or last - since > RECIPE_CHANGES_KEEP:
+        return last, None
+    keys = [recipe_change_key(number) for number in range(since + 1,
+                                                          last + 1)]
+    changes = cache.get_many(keys)
+    if len(changes) != len(keys):
+        return last, None
+    return last, set(changes.values())
+
+
+def reset_recipe_changes():
+    """Skip the log past RECIPE_CHANGES_KEEP so indexes are rebuilt;
+    called after bulk loads."""
+    cache.set(RECIPE_CHANGES_LAST_KEY,
+              cache.get(RECIPE_CHANGES_LAST_KEY, 0) + RECIPE_CHANGES_KEEP + 1,
+              timeout=None)
+
+
+def recipe_ingredients_deleted(sender, instance, **kwargs):
+    """Receiver for Recipes post_delete."""
+    recipe_ingredients_changed(instance.pk)
@@ -0,0 +1,92 @@
+import mmap
+import os
+import struct
+import threading
+
+import numpy as np
+from django.conf import settings
+
+# File of build_similar: header (magic, number of recipes, neighbours per
+# recipe), sorted recipe ids, neighbour ids (-1 pads short rows) and
+# cosine similarities, row by row
+MAGIC = b'SIM1'
+HEADER = struct.Struct('<4sII')
+ID_TYPE = np.dtype('<i4')
+SCORE_TYPE = np.dtype('<f4')
+
+
+def write_neighbours(path, ids, neighbours, scores):
+    """
+    Replace the file atomically, mapped files of workers stay valid.
+    :param ids: sorted recipe ids, N
+    :param neighbours: N x K recipe ids
+    :param scores: N x K similarities
+    """
+    if len(ids) and ids[-1] > np.iinfo(ID_TYPE).max:
+        raise ValueError(f'Recipe ids do not fit {ID_TYPE}')
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    temporary = f'{path}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, len(ids), neighbours.shape[1]))
+        file.write(np.ascontiguousarray(ids, ID_TYPE).tobytes())
+        file.write(np.ascontiguousarray(neighbours, ID_TYPE).tobytes())
+        file.write(np.ascontiguousarray(scores, SCORE_TYPE).tobytes())
+    os.replace(temporary, path)
+
+
+def read_neighbours(path):
+    """:return: (ids, neighbours, scores) arrays over a memory map"""
+    with open(path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, count, top = HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise ValueError(f'{path} is not a build_similar file')
+    offset = HEADER.size
+    ids = np.frombuffer(buffer, ID_TYPE, count, offset)
+    offset += ids.nbytes
+    neighbours = np.frombuffer(buffer, ID_TYPE, count * top, offset)
+    offset += neighbours.nbytes
+    scores = np.frombuffer(buffer, SCORE_TYPE, count * top, offset)
+    return ids, neighbours.reshape(count, top), scores.reshape(count, top)
+
+
+class SimilarRecipes:
+    """
+    Neighbours from settings.SIMILAR_RECIPES_FILE, mapped once per worker
+    process: the pages are shared by all workers through the page cache.
+    A file replaced by build_similar is mapped again.
+    """
+    def __init__(self):
+        self.stamp = None
+        self.data = None
+        self.lock = threading.Lock()
+
+    def load(self):
+        try:
+            stat = os.stat(settings.SIMILAR_RECIPES_FILE)
+            stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self.stamp:
+            return self.data
+        with self.lock:
+            if stamp != self.stamp:
+                self.data = (read_neighbours(settings.SIMILAR_RECIPES_FILE)
+                             if stamp else None)
+                self.stamp = stamp
+        return self.data
+
+    def neighbours(self, recipe_id):
+        """:return: [(recipe id, similarity)], the most similar first"""
+        data = self.load()
+        if data is None:
+            return []
+        ids, neighbours, scores = data
+        row = np.searchsorted(ids, recipe_id)
+        if row == len(ids) or ids[row] != recipe_id:
+            return []
+        return [(int(neighbour), float(score)) for neighbour, score in zip(
+            neighbours[row], scores[row]) if neighbour >= 0]
+
+
+similar_recipes = SimilarRecipes()
@@ -0,0 +1,169 @@
+import base64
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from PIL import Image
+
+from recipes.images import (DECODE_CHUNK_SIZE, THUMBNAIL_SIZES,
+                            ImageTooLarge, decode_base64,
+                            process_recipe_image, schedule_recipe_image,
+                            thumbnail_urls)
+from recipes.models import Recipes
+
+
+def png(size):
+    """:return: PNG of random pixels, barely compressible"""
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', (size, size), os.urandom(size * size * 3)).save(
+        buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class RecordingUpload(TemporaryUploadedFile):
+    created = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created.append(self)
+
+
+class DecodeBase64Test(SimpleTestCase):
+    def setUp(self):
+        RecordingUpload.created = []
+
+    def decode(self, data):
+        with mock.patch('recipes.images.TemporaryUploadedFile',
+                        RecordingUpload):
+            return decode_base64(data)
+
+    def test_chunks(self):
+        content = png(200)
+        encoded = base64.b64encode(content).decode()
+        self.assertGreater(len(encoded), 2 * DECODE_CHUNK_SIZE)
+        with self.decode(f'data:image/png;base64,{encoded}') as upload:
+            self.assertEqual(upload.read(), content)
+            self.assertEqual(upload.size, len(content))
+
+    def test_wrapped_lines(self):
+        content = png(200)
+        encoded = base64.b64encode(content).decode()
+        wrapped = '\n'.join(encoded[start:start + 76]
+                            for start in range(0, len(encoded), 76))
+        with self.decode(f'data:image/png;base64,{wrapped}') as upload:
+            self.assertEqual(upload.read(), content)
+
+    def test_not_an_image(self):
+        data = base64.b64encode(b'not an image' * 10000).decode()
+        with self.assertRaises(OSError):
+            self.decode(f'data:image/png;base64,{data}')
+        self.assertTrue(RecordingUpload.created[0].closed)
+
+    def test_truncated_base64(self):
+        data = base64.b64encode(png(10)).decode()[:-1]
+        with self.assertRaises(ValueError):
+            self.decode(f'data:image/png;base64,{data}')
+        self.assertTrue(RecordingUpload.created[0].closed)
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=50)
+    def test_too_many_pixels(self):
+        data = base64.b64encode(png(10)).decode()
+        with self.assertRaises(ImageTooLarge):
+            self.decode(f'data:image/png;base64,{data}')
+        self.assertTrue(RecordingUpload.created[0].closed)
+
+
+class RecipeImagesTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, True)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+
+    @staticmethod
+    def create(size=800):
+        name = default_storage.save('recipe/test.png', ContentFile(png(size)))
+        return Recipes.objects.create(name='Рецепт', text='Текст',
+                                      cooking_time=1, image=name)
+
+    def urls(self, recipe):
+        recipe.refresh_from_db()
+        return thumbnail_urls(recipe.image)
+
+    def assert_thumbnails(self, recipe, extension):
+        recipe.refresh_from_db()
+        self.assertEqual(set(recipe.thumbnails), set(THUMBNAIL_SIZES))
+        for size, name in recipe.thumbnails.items():
+            self.assertTrue(name.endswith(f'_{size}.{extension}'), name)
+            with default_storage.open(name) as thumbnail, \
+                    Image.open(thumbnail) as image:
+                self.assertEqual(max(image.size), THUMBNAIL_SIZES[size])
+        self.assertEqual(self.urls(recipe), {
+            size: default_storage.url(name)
+            for size, name in recipe.thumbnails.items()})
+
+    def test_process_recipe_image(self):
+        recipe = self.create(2000)
+        original = recipe.image.name
+        self.assertEqual(set(self.urls(recipe).values()),
+                         {default_storage.url(original)})
+        process_recipe_image(recipe.pk, original)
+        recipe.refresh_from_db()
+        self.assertTrue(recipe.image.name.endswith('.webp'))
+        self.assertFalse(default_storage.exists(original))
+        with default_storage.open(recipe.image.name) as stored, \
+                Image.open(stored) as image:
+            self.assertEqual(max(image.size), 1600)
+        self.assert_thumbnails(recipe, 'webp')
+
+    def test_image_replaced_while_processing(self):
+        recipe = self.create()
+        original = recipe.image.name
+        Recipes.objects.filter(pk=recipe.pk).update(image='recipe/new.png')
+        process_recipe_image(recipe.pk, original)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image.name, 'recipe/new.png')
+        self.assertEqual(recipe.thumbnails, {})
+        self.assertFalse(default_storage.exists('recipe/test.webp'))
+
+    @override_settings(RECIPE_IMAGE_WORKERS=0)
+    def test_failure_in_request(self):
+        """The recipe is saved already, the original is served."""
+        recipe = self.create()
+        with mock.patch('recipes.images.open_image', side_effect=OSError), \
+                self.assertLogs('recipes.images', 'ERROR'):
+            schedule_recipe_image(recipe)
+        self.assertEqual(set(self.urls(recipe).values()),
+                         {default_storage.url(recipe.image.name)})
+
+    def test_thumbnails_of_replaced_image(self):
+        recipe = self.create()
+        process_recipe_image(recipe.pk, recipe.image.name)
+        Recipes.objects.filter(pk=recipe.pk).update(image='recipe/new.png')
+        self.assertEqual(set(self.urls(recipe).values()),
+                         {default_storage.url('recipe/new.png')})
+
+    def test_make_thumbnails(self):
+        recipe = self.create()
+        call_command('make_thumbnails', workers=1, stdout=io.StringIO())
+        self.assert_thumbnails(recipe, 'webp')
+        output = io.StringIO()
+        call_command('make_thumbnails', workers=1, stdout=output)
+        self.assertIn('0 thumbnails written', output.getvalue())
+
+    def test_format_change(self):
+        recipe = self.create()
+        process_recipe_image(recipe.pk, recipe.image.name)
+        with override_settings(RECIPE_IMAGE_FORMAT='JPEG'):
+            # Thumbnails written in the old format are still served
+            self.assert_thumbnails(recipe, 'webp')
+            call_command('make_thumbnails', workers=1, stdout=io.StringIO())
+            self.assert_thumbnails(recipe, 'jpg')
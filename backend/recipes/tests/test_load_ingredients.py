@@ -0,0 +1,43 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from recipes.models import Ingredients
+
+
+class LoadIngredientsTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def test_csv(self):
+        path = self.write('ingredients.csv', 'лук,г\n\nморковь,шт.\nлук,г\n')
+        call_command('load_ingredients', path=path, skip_existing=True,
+                     stdout=io.StringIO())
+        self.assertEqual(
+            sorted(Ingredients.objects.values_list('name',
+                                                   'measurement_unit')),
+            [('лук', 'г'), ('морковь', 'шт.')])
+
+    def test_csv_row_without_unit(self):
+        path = self.write('ingredients.csv', 'лук,г\nморковь\n')
+        with self.assertRaisesMessage(CommandError, 'line 2'):
+            call_command('load_ingredients', path=path,
+                         stdout=io.StringIO())
+        self.assertFalse(Ingredients.objects.exists())
+
+    def test_json_item_without_unit(self):
+        path = self.write('ingredients.json', '[{"name": "лук"}]')
+        with self.assertRaisesMessage(CommandError, 'item 0'):
+            call_command('load_ingredients', path=path,
+                         stdout=io.StringIO())
@@ -0,0 +1,64 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from django.test import SimpleTestCase, override_settings
+
+from recipes.similar import (SimilarRecipes, read_neighbours,
+                             write_neighbours)
+
+
+class NeighboursFileTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.path = os.path.join(directory, 'similar', 'recipes.bin')
+        self.ids = np.array([1, 5, 9])
+        self.neighbours = np.array([[5, 9], [1, -1], [5, 1]])
+        self.scores = np.array([[0.9, 0.5], [0.9, 0], [0.7, 0.5]])
+
+    def test_round_trip(self):
+        write_neighbours(self.path, self.ids, self.neighbours, self.scores)
+        ids, neighbours, scores = read_neighbours(self.path)
+        np.testing.assert_array_equal(ids, self.ids)
+        np.testing.assert_array_equal(neighbours, self.neighbours)
+        np.testing.assert_allclose(scores, self.scores, rtol=1e-6)
+        self.assertEqual(neighbours.shape, (3, 2))
+        self.assertFalse(os.path.exists(f'{self.path}.tmp'))
+
+    def test_empty(self):
+        write_neighbours(self.path, np.array([], dtype=np.int64),
+                         np.empty((0, 2)), np.empty((0, 2)))
+        ids, neighbours, scores = read_neighbours(self.path)
+        self.assertEqual(neighbours.shape, (0, 2))
+
+    def test_not_a_neighbours_file(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'wb') as file:
+            file.write(b'\0' * 64)
+        with self.assertRaises(ValueError):
+            read_neighbours(self.path)
+
+    def test_ids_too_large(self):
+        with self.assertRaises(ValueError):
+            write_neighbours(self.path, np.array([2 ** 31]),
+                             np.array([[-1]]), np.array([[0]]))
+
+    def test_replaced_file_mapped_again(self):
+        similar = SimilarRecipes()
+        with override_settings(SIMILAR_RECIPES_FILE=self.path):
+            self.assertEqual(similar.neighbours(1), [])
+            write_neighbours(self.path, self.ids, self.neighbours,
+                             self.scores)
+            self.assertEqual([recipe for recipe, _ in similar.neighbours(1)],
+                             [5, 9])
+            self.assertEqual([recipe for recipe, _ in similar.neighbours(5)],
+                             [1])
+            self.assertEqual(similar.neighbours(2), [])
+            write_neighbours(self.path, self.ids, self.neighbours[:, ::-1],
+                             self.scores[:, ::-1])
+            self.assertEqual([recipe for recipe, _ in similar.neighbours(1)],
+                             [9, 5])
+            os.remove(self.path)
+            self.assertEqual(similar.neighbours(1), [])